@@ -0,0 +1,23 @@
+"""Общие для бенчмарков перцентили и сводка по замерам (в мс)."""
+from typing import Optional, Sequence
+
+def pct(values: Sequence[float], q: float) -> Optional[float]:
+    """Перцентиль q (0..1) выборки в секундах — в мс."""
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+def summary(samples: Sequence[float], ops_per_sec: bool = False) -> dict:
+    """n, p50/p95/p99/max в мс; ops_per_sec — только для последовательных замеров (n / суммарное время)."""
+    result = {
+        "n": len(samples),
+        "p50_ms": pct(samples, 0.5),
+        "p95_ms": pct(samples, 0.95),
+        "p99_ms": pct(samples, 0.99),
+        "max_ms": round(max(samples) * 1000, 3) if samples else None,
+    }
+    if ops_per_sec:
+        total = sum(samples)
+        result["ops_per_sec"] = round(len(samples) / total, 1) if total else None
+    return result
@@ -0,0 +1,218 @@
+"""
+Бенчмарк слоя данных и отрисовки карточек на SQLite-файле реалистичного размера.
+
+Запуск: python -m benchmarks.bench_db [--ads 10000] [--db /tmp/bench_10000.db] [--ops 2000] [--out result.json] [--compare old.json]
+Файл БД заполняется один раз (объявления поровну по SERVERS × CATEGORIES × продажа/покупка,
+поля по шаблонам формы, часть с фото и закрепом) и переиспользуется при следующих запусках.
+Для сравнения объёмов: for n in 10000 100000 1000000; do python -m benchmarks.bench_db --ads $n; done
+
+Меряются add_ad, get_ads, get_ads_page, get_ad, get_user_ads, search_ads, delete_ad (удаляются
+добавленные в этом прогоне) и путь отрисовки: format_ad_message, карточка + show_search_result
+с заглушкой сообщения (разметка сериализуется, как в запросе PTB) без кэша и из кэша.
+Результат — JSON с p50/p95/p99/max в мс и операциями в секунду; --compare печатает отношение p50/p95 к старому прогону.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from benchmarks._stats import summary  # noqa: E402
+
+NICKS = ["Ivan_Petrov", "John_Smith", "Max_Volkov", "Alex_Storm", "Denis_King", "Oleg_Frost"]
+NAMES = {
+    "Машина": ["Infernus", "Bullet", "Cheetah", "Sultan RS", "Elegy", "Turismo", "BMW M5 F90", "Mercedes G63"],
+    "Недвижимость": ["Дом №12", "Особняк на Vinewood", "Квартира в центре", "Дом у пляжа"],
+    "Аксессуар": ["Маска дракона", "Крылья ангела", "Рюкзак Supreme", "Очки Cartier"],
+    "Бизнес": ["АЗС", "Магазин 24/7", "Закусочная", "Автосалон"],
+}
+PRICES = ["{}kk", "{}к", "{} 000 000$", "{} млн", "{}.5kk", "договорная"]
+
+def _timed(fn, args_list) -> list:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def make_fields(rnd: random.Random, category: str, action: str, templates) -> dict:
+    fields_template, fields_buy = templates
+    keys = (fields_buy if action == "buy" else fields_template).get(category, [])
+    fields = {}
+    for key in keys:
+        if key == "Ваш ник":
+            fields[key] = rnd.choice(NICKS)
+        elif key in ("Цена", "Бюджет"):
+            fields[key] = rnd.choice(PRICES).format(rnd.randint(1, 300))
+        elif "Доход" in key:
+            fields[key] = f"{rnd.randint(10, 500)}к"
+        elif key.startswith("Контакт"):
+            fields[key] = f"@tg_{rnd.randint(1000, 99999)}"
+        else:
+            fields[key] = f"{rnd.choice(NAMES.get(category, ['Лот']))} {rnd.randint(1, 999)}"
+    return fields
+
+def make_ad(rnd: random.Random, ad_id, users: int, now: int, grid, templates) -> dict:
+    server, category, action = grid[rnd.randrange(len(grid))]
+    created_at = now - rnd.randint(0, 29 * 86400)
+    return {
+        "id": ad_id,
+        "user_id": rnd.randint(1, users),
+        "username": f"user{rnd.randint(1, users)}",
+        "server": server,
+        "category": category,
+        "type": rnd.choice(["Обычный", "Обычный", "Ивент", "BattlePass"]),
+        "action": action,
+        "vip": 1 if rnd.random() < 0.05 else 0,
+        "pinned": 1 if rnd.random() < 0.01 else 0,
+        "created_at": created_at,
+        "fields": make_fields(rnd, category, action, templates),
+        "photos": [f"AgACAgIAAxkBAAI{rnd.getrandbits(64):x}" for _ in range(rnd.choice([0, 0, 1, 2, 3]))],
+    }
+
+def seed(db, ads: int, users: int, grid, templates, batch: int = 5000) -> float:
+    """Дозаполнить БД до ads объявлений (id 1..ads); возвращает время в секундах."""
+    have = db.get_conn().execute("SELECT count(*) FROM ads").fetchone()[0]
+    if have >= ads:
+        return 0.0
+    rnd = random.Random(have)
+    now = int(time.time())
+    start = time.perf_counter()
+    for first in range(have + 1, ads + 1, batch):
+        chunk = [make_ad(rnd, i, users, now, grid, templates) for i in range(first, min(ads, first + batch - 1) + 1)]
+        db.import_ads(chunk)
+        print(f"seed: {chunk[-1]['id']}/{ads}", file=sys.stderr)
+    return time.perf_counter() - start
+
+class _FakeMessage:
+    """Сообщение без сети: ответы сериализуют разметку так же, как запрос к Bot API."""
+
+    photo = ()
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        return json.dumps({"text": text, "reply_markup": reply_markup.to_dict() if reply_markup else None}, ensure_ascii=False)
+
+    async def reply_photo(self, photo, caption=None, reply_markup=None, **kwargs):
+        return json.dumps({"photo": photo, "caption": caption, "reply_markup": reply_markup.to_dict() if reply_markup else None}, ensure_ascii=False)
+
+def bench_render(m, ads: list) -> dict:
+    from bot.cache import ad_cards
+
+    message = _FakeMessage()
+    loop = asyncio.new_event_loop()
+
+    def render(ad):
+        card = m.get_ad_card(ad)
+        loop.run_until_complete(m.show_search_result(message, card, has_prev=True, has_next=True))
+
+    def uncached(ad):
+        ad_cards.invalidate(ad["id"])
+        render(ad)
+
+    try:
+        return {
+            "format_ad_message": summary(_timed(m.format_ad_message, [(ad,) for ad in ads]), ops_per_sec=True),
+            "render_uncached": summary(_timed(uncached, [(ad,) for ad in ads]), ops_per_sec=True),
+            "render_cached": summary(_timed(render, [(ad,) for ad in ads]), ops_per_sec=True),
+        }
+    finally:
+        loop.close()
+
+def run(ads: int, ops: int, seed_only: bool = False) -> dict:
+    from bot import db
+    import bot.main as m
+
+    grid = [(s, c, a) for s in m.SERVERS for c in m.CATEGORIES for a in ("sell", "buy")]
+    templates = (m.FIELDS_TEMPLATE, m.FIELDS_TEMPLATE_BUY)
+    users = max(1, ads // 5)
+    db.init_db(m.FIELD_KEYS)
+    seed_seconds = seed(db, ads, users, grid, templates)
+    conn = db.get_conn()
+    total = conn.execute("SELECT count(*) FROM ads").fetchone()[0]
+    result = {
+        "commit": _commit(),
+        "sqlite": sqlite3.sqlite_version,
+        "ads": total,
+        "seed_seconds": round(seed_seconds, 1),
+        "db_bytes": db.storage_size(conn)["total"],
+    }
+    if seed_only:
+        return result
+
+    rnd = random.Random(42)
+    now = int(time.time())
+    max_id = conn.execute("SELECT max(id) FROM ads").fetchone()[0]
+    ids = [rnd.randint(1, max_id) for _ in range(ops)]
+    filters = [grid[rnd.randrange(len(grid))] for _ in range(ops)]
+    new_ads = [make_ad(rnd, None, users, now, grid, templates) for _ in range(ops)]
+
+    added = []
+
+    def add(ad):
+        added.append(db.add_ad(ad["user_id"], ad["username"], ad["server"], ad["category"], ad["type"], ad["action"], ad["fields"], ad["photos"]))
+
+    ops_result = {}
+    ops_result["add_ad"] = summary(_timed(add, [(ad,) for ad in new_ads]), ops_per_sec=True)
+    ops_result["get_ad"] = summary(_timed(db.get_ad, [(i,) for i in ids]), ops_per_sec=True)
+    ops_result["get_ads"] = summary(_timed(lambda s, c, a: db.get_ads(s, c, a, limit=10), filters), ops_per_sec=True)
+    ops_result["get_ads(id)"] = summary(_timed(lambda s, c, a: db.get_ads(s, c, a, limit=100, columns=("id",)), filters), ops_per_sec=True)
+    ops_result["get_ads_page"] = summary(_timed(lambda s, c, a: db.get_ads_page(s, c, a), filters), ops_per_sec=True)
+    ops_result["get_ads_page(price)"] = summary(_timed(lambda s, c, a: db.get_ads_page(s, c, a, sort="price"), filters), ops_per_sec=True)
+    ops_result["get_user_ads"] = summary(_timed(db.get_user_ads, [(rnd.randint(1, users),) for _ in range(ops)]), ops_per_sec=True)
+    words = [rnd.choice(NAMES[rnd.choice(list(NAMES))]).split()[0][:4] for _ in range(ops)]
+    ops_result["search_ads"] = summary(_timed(lambda w, s: db.search_ads(w, s), [(w, f[0]) for w, f in zip(words, filters)]), ops_per_sec=True)
+    ops_result["delete_ad"] = summary(_timed(db.delete_ad, [(i,) for i in added]), ops_per_sec=True)
+    result["ops"] = ops_result
+    result["render"] = bench_render(m, [ad for ad in map(db.get_ad, ids[:1000]) if ad is not None])
+    db.close_db()
+    return result
+
+def _commit():
+    try:
+        cwd = os.path.dirname(os.path.realpath(__file__))
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(old: dict, new: dict) -> dict:
+    """Отношение new/old для p50 и p95 каждой операции (> 1 — стало медленнее)."""
+    diff = {}
+    for section in ("ops", "render"):
+        for name, stats in new.get(section, {}).items():
+            before = old.get(section, {}).get(name)
+            if not before:
+                continue
+            diff[name] = {f"{q}_ratio": round(stats[f"{q}_ms"] / before[f"{q}_ms"], 2) if before.get(f"{q}_ms") else None for q in ("p50", "p95")}
+    return diff
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ads", type=int, default=10000)
+    parser.add_argument("--db", default="", help="файл БД (по умолчанию /tmp/bench_<ads>.db)")
+    parser.add_argument("--ops", type=int, default=2000, help="операций на каждый замер")
+    parser.add_argument("--seed-only", action="store_true")
+    parser.add_argument("--out", default="", help="сохранить результат в файл")
+    parser.add_argument("--compare", default="", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    # DB_PATH читается bot.config при импорте, поэтому модули бота импортируются внутри run()
+    os.environ["DB_PATH"] = args.db or f"/tmp/bench_{args.ads}.db"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    result = run(args.ads, args.ops, args.seed_only)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            result["compare"] = compare(json.load(f), result)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Нагрузочный тест PerChatUpdateProcessor: пропускная способность при разных
+лимитах параллельности и проверка порядка обновлений внутри чата.
+
+Запуск: python -m benchmarks.bench_dispatch [--users 200] [--per-user 10] [--latency 0.02]
+Каждое обновление «обрабатывается» asyncio.sleep(latency) — как ожидание ответа Bot API.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram import Update  # noqa: E402
+from bot.dispatch import PerChatUpdateProcessor  # noqa: E402
+
+def make_updates(users: int, per_user: int, seed: int = 1):
+    """Перемешанный поток сообщений: у каждого пользователя свой чат и свои порядковые номера."""
+    order = [u for u in range(users) for _ in range(per_user)]
+    random.Random(seed).shuffle(order)
+    counters = [0] * users
+    updates = []
+    for i, u in enumerate(order):
+        seq = counters[u]
+        counters[u] += 1
+        data = {
+            "update_id": i,
+            "message": {
+                "message_id": seq,
+                "date": 0,
+                "chat": {"id": 1000 + u, "type": "private"},
+                "from": {"id": 1000 + u, "is_bot": False, "first_name": f"u{u}"},
+                "text": str(seq),
+            },
+        }
+        updates.append(Update.de_json(data, None))
+    return updates
+
+async def run_once(limit: int, updates, latency: float) -> dict:
+    processor = PerChatUpdateProcessor(limit)
+    await processor.initialize()
+    seen = {}
+    violations = 0
+
+    async def handle(update: Update):
+        nonlocal violations
+        chat = update.effective_chat.id
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        expected = seen.get(chat, -1) + 1
+        if update.message.message_id != expected:
+            violations += 1
+        seen[chat] = update.message.message_id
+
+    start = time.perf_counter()
+    # как Application._update_fetcher при concurrent_updates > 1: задача на каждое обновление
+    await asyncio.gather(*(processor.process_update(u, handle(u)) for u in updates))
+    elapsed = time.perf_counter() - start
+    await processor.shutdown()
+    return {
+        "limit": limit,
+        "updates": len(updates),
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(updates) / elapsed, 1),
+        "max_active": processor.max_active,
+        "order_violations": violations,
+    }
+
+async def run(users: int, per_user: int, latency: float, limits) -> list:
+    updates = make_updates(users, per_user)
+    return [await run_once(limit, updates, latency) for limit in limits]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--limits", default="1,4,16,64,256")
+    args = parser.parse_args()
+    limits = [int(x) for x in args.limits.split(",")]
+    results = asyncio.run(run(args.users, args.per_user, args.latency, limits))
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
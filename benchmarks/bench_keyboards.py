@@ -0,0 +1,60 @@
+"""
+Микробенчмарк клавиатур меню: сборка InlineKeyboardMarkup на каждое нажатие
+против готовых клавиатур из bot.keyboards.KeyboardRegistry.
+
+Запуск: python -m benchmarks.bench_keyboards [--rounds 20000]
+Для каждой клавиатуры меряется то, что происходит на одно обновление:
+сборка разметки (для старого пути) + to_dict() + json.dumps, как в запросе PTB.
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+from bot.main import KEYBOARDS, SERVERS, CATEGORIES, TYPES_BASE  # noqa: E402
+
+def _fresh_picker(items, prefix):
+    kb = [[InlineKeyboardButton(i, callback_data=f"{prefix}:{i}")] for i in items]
+    kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
+    return InlineKeyboardMarkup(kb)
+
+def _fresh_main():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("Продать", callback_data="action:sell"), InlineKeyboardButton("Купить", callback_data="action:buy")],
+        [InlineKeyboardButton("Поиск", callback_data="action:search"), InlineKeyboardButton("Профиль", callback_data="action:profile")],
+        [InlineKeyboardButton("VIP / Подписка", callback_data="action:vip"), InlineKeyboardButton("Услуги", callback_data="action:services")],
+        [InlineKeyboardButton("Техподдержка", url="https://t.me/azdanm")],
+    ])
+
+CASES = {
+    "main": (_fresh_main, lambda: KEYBOARDS.main),
+    "servers": (lambda: _fresh_picker(SERVERS, "server"), lambda: KEYBOARDS.servers),
+    "categories": (lambda: _fresh_picker(CATEGORIES, "category"), lambda: KEYBOARDS.categories),
+    "types": (lambda: _fresh_picker(TYPES_BASE, "type"), lambda: KEYBOARDS.types),
+}
+
+def _per_call_us(factory, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        json.dumps(factory().to_dict())
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def run(rounds: int) -> dict:
+    results = {}
+    for name, (fresh, cached) in CASES.items():
+        before = _per_call_us(fresh, rounds)
+        after = _per_call_us(cached, rounds)
+        results[name] = {"fresh_us": round(before, 2), "registry_us": round(after, 2), "saved_us": round(before - after, 2), "speedup": round(before / after, 1) if after else None}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rounds), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Нагрузочный прогон бота целиком: build_app() + синтетические пользователи + заглушка Bot API.
+
+Запуск: python -m benchmarks.bench_load [--users 1000] [--search-share 0.5] [--ramp 10] [--think 0.5] [--latency 0.03] [--p429 0.01]
+Каждый пользователь — отдельная задача, которая шлёт следующее обновление только после того, как бот
+обработал предыдущее (как живой клиент). Продавцы проходят форму: action:sell → server → category → type →
+поля текстом → фото (или пропуск) → confirm:publish; покупатели — поиск: action:search → search_server →
+search_category → search_do/search_cheap → несколько «Дальше» по кнопкам из последнего ответа бота.
+Обновления кладутся прямо в application.update_queue; ответы уходят по HTTP в fake_bot_api (задержка, 429).
+
+Меряются: задержка обновления от постановки в очередь до конца обработки (p50/p95/p99 по шагам и в целом),
+обновлений в секунду и лаг event loop (насколько позже срабатывает asyncio.sleep). Результат — JSON.
+Ограничитель отправки бота работает как в бою (RATE_GLOBAL_PER_SEC и т. п.), поэтому при сотнях активных
+пользователей задержку обычно определяет он; чтобы мерить саму обработку — RATE_LIMIT_ENABLED=0 и --no-limits.
+В пустой БД покупателям почти нечего листать — для выдачи в несколько страниц передайте копию файла
+из bench_db (--db /tmp/load.db после cp /tmp/bench_10000.db /tmp/load.db): прогон дописывает в него объявления.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from benchmarks._stats import summary  # noqa: E402
+from benchmarks.fake_bot_api import FakeBotAPI  # noqa: E402
+
+class LoopLag:
+    """Лаг event loop: на сколько позже заданного просыпается asyncio.sleep(interval)."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+class Client:
+    """Отправка обновлений в Application и ожидание окончания их обработки."""
+
+    def __init__(self, app, api: FakeBotAPI, timeout: float):
+        self.app = app
+        self.api = api
+        self.timeout = timeout
+        self._update_id = 0
+        self._message_id = 0
+        self._pending = {}
+        self.latencies = {}
+        self.timeouts = 0
+
+    async def done(self, update, context):
+        # последний хендлер (группа после всех): обновление обработано всеми остальными группами
+        future = self._pending.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    def _next_ids(self):
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"load{user_id}", "username": f"load{user_id}"}
+
+    def callback(self, user_id: int, data: str) -> dict:
+        update_id, message_id = self._next_ids()
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id), "from": self._user(user_id), "chat_instance": str(user_id), "data": data,
+                "message": {"message_id": message_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "text": "x"},
+            },
+        }
+
+    def message(self, user_id: int, text: str = "", photo: str = "") -> dict:
+        update_id, message_id = self._next_ids()
+        msg = {"message_id": message_id, "date": int(time.time()), "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id)}
+        if photo:
+            msg["photo"] = [{"file_id": photo, "file_unique_id": photo[-16:], "width": 1280, "height": 720}]
+        else:
+            msg["text"] = text
+            if text.startswith("/"):
+                msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": update_id, "message": msg}
+
+    async def send(self, step: str, data: dict):
+        from telegram import Update
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[data["update_id"]] = future
+        start = time.perf_counter()
+        await self.app.update_queue.put(Update.de_json(data, self.app.bot))
+        try:
+            finished = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(data["update_id"], None)
+            self.timeouts += 1
+            return
+        self.latencies.setdefault(step, []).append(finished - start)
+
+    def button(self, user_id: int, prefix: str):
+        """callback_data кнопки из последней клавиатуры бота в чате пользователя."""
+        markup = self.api.last_markup.get(user_id) or {}
+        for row in markup.get("inline_keyboard", []):
+            for button in row:
+                if str(button.get("callback_data", "")).startswith(prefix):
+                    return button["callback_data"]
+        return None
+
+async def seller(client: Client, m, user_id: int, rnd: random.Random, think: float):
+    async def step(name, data):
+        await client.send(name, data)
+        if think:
+            await asyncio.sleep(rnd.uniform(0, think))
+
+    category = rnd.choice(m.CATEGORIES)
+    await step("action:sell", client.callback(user_id, "action:sell"))
+    await step("server", client.callback(user_id, f"server:{rnd.choice(m.SERVERS)}"))
+    await step("category", client.callback(user_id, f"category:{category}"))
+    await step("type", client.callback(user_id, f"type:{rnd.choice(m.TYPES_BASE)}"))
+    for key in m.FIELDS_TEMPLATE.get(category, m.FIELDS_DEFAULT):
+        value = f"{rnd.randint(1, 300)}kk" if key == "Цена" else f"{key.split()[0]} {rnd.randint(1, 9999)}"
+        await step("field", client.message(user_id, value))
+    photos = rnd.choice([0, 0, 1, 2, 3])
+    if photos:
+        await step("attach", client.callback(user_id, "attach:photos"))
+        for _ in range(photos):
+            await step("photo", client.message(user_id, photo=f"AgACAgIAAxkBAAI{rnd.getrandbits(64):x}"))
+        await step("done", client.message(user_id, "/done"))
+    else:
+        await step("attach", client.callback(user_id, "attach:skip"))
+    await step("confirm:publish", client.callback(user_id, "confirm:publish"))
+
+async def searcher(client: Client, m, user_id: int, rnd: random.Random, think: float, pages: int):
+    async def step(name, data):
+        await client.send(name, data)
+        if think:
+            await asyncio.sleep(rnd.uniform(0, think))
+
+    category = rnd.choice(m.CATEGORIES)
+    await step("action:search", client.callback(user_id, "action:search"))
+    await step("search_server", client.callback(user_id, f"search_server:{rnd.choice(m.SERVERS)}"))
+    await step("search_category", client.callback(user_id, f"search_category:{category}"))
+    mode = rnd.choice(["search_do", "search_cheap"])
+    await step(mode, client.callback(user_id, f"{mode}:{rnd.choice(['sell', 'buy'])}:{category}"))
+    for _ in range(pages):
+        data = client.button(user_id, "search_nav:next") or client.button(user_id, "search_pnav:next")
+        if data is None:
+            break
+        await step("search_nav", client.callback(user_id, data))
+
+async def run(args) -> dict:
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, p429=args.p429, enforce_limits=not args.no_limits, seed=1)
+    url = await api.start()
+    # конфигурация бота читается при импорте bot.config — окружение задаётся до импорта
+    db_dir = tempfile.mkdtemp(prefix="bench_load_")
+    os.environ["BOT_API_URL"] = url
+    os.environ["DB_PATH"] = args.db or os.path.join(db_dir, "bot.db")
+    os.environ["CHANNEL_USERNAME"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    import bot.main as m
+    from bot import repo
+    from bot.db import close_db
+    from bot.notify import notifier
+    from bot.saved import saved_searches
+    from bot.users import user_writes
+
+    # как main(), но без polling: обновления кладутся прямо в очередь приложения
+    m.init_db(m.FIELD_KEYS)
+    saved_searches.load()
+    app = m.build_app()
+    client = Client(app, api, args.timeout)
+    app.add_handler(TypeHandler(Update, client.done), group=1000)
+    lag = LoopLag()
+    rnd = random.Random(args.seed)
+    try:
+        async with app:
+            await app.start()
+            notifier.start(app.bot)
+            lag.start()
+            tasks = []
+            start = time.perf_counter()
+            for i in range(args.users):
+                user_id = 100000 + i
+                user_rnd = random.Random(rnd.getrandbits(32))
+                if rnd.random() < args.search_share:
+                    flow = searcher(client, m, user_id, user_rnd, args.think, args.pages)
+                else:
+                    flow = seller(client, m, user_id, user_rnd, args.think)
+                tasks.append(asyncio.create_task(flow))
+                if args.ramp:
+                    await asyncio.sleep(args.ramp / args.users)
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+            await lag.stop()
+            await app.stop()
+            await notifier.stop()
+            await user_writes.flush()
+    finally:
+        repo.shutdown()
+        close_db()
+        await api.stop()
+
+    all_latencies = [x for samples in client.latencies.values() for x in samples]
+    return {
+        "users": args.users,
+        "search_share": args.search_share,
+        "updates": len(all_latencies),
+        "timeouts": client.timeouts,
+        "seconds": round(elapsed, 2),
+        "updates_per_sec": round(len(all_latencies) / elapsed, 1) if elapsed else None,
+        "latency": summary(all_latencies),
+        "latency_by_step": {step: summary(samples) for step, samples in client.latencies.items()},
+        "loop_lag": summary(lag.samples),
+        "notifier": notifier.stats(),
+        "api": api.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--search-share", type=float, default=0.5, help="доля пользователей, которые ищут (остальные публикуют)")
+    parser.add_argument("--pages", type=int, default=3, help="сколько раз покупатель листает выдачу")
+    parser.add_argument("--ramp", type=float, default=10.0, help="за сколько секунд приходят все пользователи")
+    parser.add_argument("--think", type=float, default=0.5, help="пауза пользователя между шагами, до N секунд")
+    parser.add_argument("--latency", type=float, default=0.03, help="задержка ответа Bot API")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--p429", type=float, default=0.0, help="доля случайных 429 от Bot API")
+    parser.add_argument("--no-limits", action="store_true", help="не эмулировать лимиты Telegram в заглушке")
+    parser.add_argument("--timeout", type=float, default=60.0, help="сколько ждать обработки одного обновления")
+    parser.add_argument("--db", default="", help="файл БД (по умолчанию новый во временном каталоге)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Проверка TokenBucketRateLimiter на локальной заглушке Bot API.
+
+Запуск: python -m benchmarks.bench_ratelimit [--chats 20] [--per-chat 5] [--bulk 150]
+Одновременно шлются интерактивные ответы (по несколько в чат) и фоновая
+рассылка по разным чатам. Сравниваются прогоны без ограничителя и с ним:
+число 429 от заглушки, время завершения и задержки интерактивных/фоновых отправок.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from telegram.error import RetryAfter  # noqa: E402
+from telegram.ext import ExtBot  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+from bot.ratelimit import TokenBucketRateLimiter  # noqa: E402
+from benchmarks._stats import pct  # noqa: E402
+from benchmarks.fake_bot_api import FakeBotAPI  # noqa: E402
+
+async def run_once(with_limiter: bool, chats: int, per_chat: int, bulk: int) -> dict:
+    api = FakeBotAPI(latency=0.005)
+    url = await api.start()
+    limiter = TokenBucketRateLimiter() if with_limiter else None
+    bot = ExtBot("0:bench", base_url=f"{url}/bot", rate_limiter=limiter, request=HTTPXRequest(connection_pool_size=32))
+    await bot.initialize()
+    latencies = {"interactive": [], "bulk": []}
+    errors = 0
+
+    async def send(chat_id, kind):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            kwargs = {"rate_limit_args": {"priority": kind}} if limiter else {}
+            await bot.send_message(chat_id, "x", **kwargs)
+            latencies[kind].append(time.perf_counter() - start)
+        except RetryAfter:
+            errors += 1
+
+    start = time.perf_counter()
+    jobs = [send(100 + c, "interactive") for c in range(chats) for _ in range(per_chat)]
+    jobs += [send(10000 + i, "bulk") for i in range(bulk)]
+    await asyncio.gather(*jobs)
+    elapsed = time.perf_counter() - start
+    await bot.shutdown()
+    await api.stop()
+    return {
+        "limiter": with_limiter,
+        "seconds": round(elapsed, 2),
+        "delivered": len(latencies["interactive"]) + len(latencies["bulk"]),
+        "failed_429": errors,
+        "api_429": api.limit_violations,
+        "interactive_p50_ms": pct(latencies["interactive"], 0.5),
+        "interactive_p95_ms": pct(latencies["interactive"], 0.95),
+        "bulk_p50_ms": pct(latencies["bulk"], 0.5),
+        "bulk_p95_ms": pct(latencies["bulk"], 0.95),
+        "limiter_stats": limiter.stats() if limiter else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--per-chat", type=int, default=5)
+    parser.add_argument("--bulk", type=int, default=150)
+    args = parser.parse_args()
+    results = [asyncio.run(run_once(flag, args.chats, args.per_chat, args.bulk)) for flag in (False, True)]
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Локальная заглушка Bot API на aiohttp для тестов и нагрузочных прогонов.
+
+Отвечает на основные методы, которые использует бот (getMe, sendMessage,
+sendPhoto, sendMediaGroup, editMessage*, answerCallbackQuery, getChatMember,
+setWebhook, getUpdates ...), с настраиваемой задержкой. Как настоящий Telegram,
+возвращает 429 с retry_after при превышении лимитов (глобального, на чат и на
+группу; лимиты моделируются как token bucket),
+а также может подмешивать случайные 429.
+
+Запуск отдельно: python -m benchmarks.fake_bot_api --port 8081 --latency 0.05 --p429 0.01
+Бот направляется на заглушку через BOT_API_URL=http://127.0.0.1:8081
+"""
+import argparse
+import asyncio
+import bisect
+import collections
+import json
+import random
+import time
+from typing import Any, Deque, Dict, List, Optional
+from aiohttp import web
+
+# Окна (сек), в которых проверяется соблюдение лимитов, и допуск на дрожание таймеров
+_WINDOWS = (1.0, 10.0, 60.0)
+_SLACK = 1
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, p429: float = 0.0, retry_after: int = 1, global_per_sec: int = 30, chat_per_sec: int = 1, chat_burst: int = 3, group_per_min: int = 20, group_burst: int = 5, enforce_limits: bool = True, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.p429 = p429
+        self.retry_after = retry_after
+        self.global_per_sec = global_per_sec
+        self.chat_per_sec = chat_per_sec
+        self.chat_burst = chat_burst
+        self.group_per_min = group_per_min
+        self.group_burst = group_burst
+        self.enforce_limits = enforce_limits
+        self._random = random.Random(seed)
+        self._global: List[float] = []
+        self._chats: Dict[Any, List[float]] = collections.defaultdict(list)
+        self._message_id = 0
+        self.calls: Dict[str, int] = collections.Counter()
+        self.limit_violations = 0
+        self.injected_429 = 0
+        self.sent: Deque[Dict[str, Any]] = collections.deque(maxlen=1000)
+        # последняя inline-клавиатура в каждом чате — по ней нагрузочный клиент «нажимает» кнопки
+        self.last_markup: Dict[Any, Dict[str, Any]] = {}
+        self.updates: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._runner: Optional[web.AppRunner] = None
+        self.port: Optional[int] = None
+
+
+    def _conforms(self, times: List[float], now: float, rate: float, burst: float) -> bool:
+        """Поток укладывается в token bucket (rate, burst): не больше burst + rate*W за любое окно W."""
+        if len(times) > 4096:
+            del times[:bisect.bisect_left(times, now - max(_WINDOWS))]
+        for window in _WINDOWS:
+            count = len(times) - bisect.bisect_right(times, now - window)
+            if count + 1 > burst + rate * window + _SLACK:
+                return False
+        return True
+
+    def _over_limit(self, chat_id: Any) -> bool:
+        now = time.monotonic()
+        if not self._conforms(self._global, now, self.global_per_sec, self.global_per_sec):
+            return True
+        if chat_id is not None:
+            times = self._chats[chat_id]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                ok = self._conforms(times, now, self.group_per_min / 60, self.group_burst)
+            else:
+                ok = self._conforms(times, now, self.chat_per_sec, self.chat_burst)
+            if not ok:
+                return True
+            times.append(now)
+        self._global.append(now)
+        return False
+
+    def _message(self, chat_id: Any, **extra) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_type = "private" if isinstance(chat_id, int) and chat_id > 0 else "supergroup"
+        msg = {"message_id": self._message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": chat_type}}
+        msg.update(extra)
+        return msg
+
+    @staticmethod
+    def _photo(file_id: str) -> list:
+        return [{"file_id": file_id, "file_unique_id": file_id[-16:] or "u", "width": 1, "height": 1}]
+
+    def _result(self, method: str, params: Dict[str, Any]) -> Any:
+        chat_id = params.get("chat_id")
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot", "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method == "sendMessage":
+            return self._message(chat_id, text=params.get("text", ""))
+        if method == "sendPhoto":
+            return self._message(chat_id, photo=self._photo(str(params.get("photo", "photo"))), caption=params.get("caption"))
+        if method == "sendMediaGroup":
+            return [self._message(chat_id, photo=self._photo(str(m.get("media", "photo")))) for m in params.get("media", [])]
+        if method in ("editMessageText", "editMessageCaption", "editMessageMedia", "editMessageReplyMarkup"):
+            if "inline_message_id" in params:
+                return True
+            extra = {"text": params["text"]} if "text" in params else {"photo": self._photo("photo")}
+            msg = self._message(chat_id, **extra)
+            msg["message_id"] = params.get("message_id", msg["message_id"])
+            return msg
+        if method == "getChatMember":
+            return {"status": "member", "user": {"id": params.get("user_id", 0), "is_bot": False, "first_name": "user"}}
+        return True
+
+    @staticmethod
+    def _params(raw: Dict[str, str]) -> Dict[str, Any]:
+        params = {}
+        for key, value in raw.items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = self._params(dict(await request.post()))
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        sending = method.startswith(("send", "edit", "copy", "forward"))
+        if sending and self.p429 and self._random.random() < self.p429:
+            self.injected_429 += 1
+            return self._too_many()
+        if sending and self.enforce_limits and self._over_limit(params.get("chat_id")):
+            self.limit_violations += 1
+            return self._too_many()
+        if sending:
+            self.sent.append({"method": method, "chat_id": params.get("chat_id"), "at": time.monotonic()})
+            if isinstance(params.get("reply_markup"), dict):
+                self.last_markup[params.get("chat_id")] = params["reply_markup"]
+        return web.json_response({"ok": True, "result": self._result(method, params)})
+
+    def _too_many(self) -> web.Response:
+        return web.json_response(
+            {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}", "parameters": {"retry_after": self.retry_after}},
+            status=429,
+        )
+
+    async def _get_updates(self, params: Dict[str, Any]) -> web.Response:
+        timeout = float(params.get("timeout") or 0)
+        batch = []
+        try:
+            batch.append(await asyncio.wait_for(self.updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            pass
+        while not self.updates.empty() and len(batch) < int(params.get("limit") or 100):
+            batch.append(self.updates.get_nowait())
+        return web.json_response({"ok": True, "result": batch})
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": dict(self.calls), "limit_violations": self.limit_violations, "injected_429": self.injected_429}
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.router.add_get("/bot{token}/{method}", self._handle)
+        app.router.add_get("/stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{self.port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def _serve(args):
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, p429=args.p429, enforce_limits=not args.no_limits)
+    url = await api.start(args.host, args.port)
+    print(f"Fake Bot API: {url} (BOT_API_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await api.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--p429", type=float, default=0.0)
+    parser.add_argument("--no-limits", action="store_true", help="не эмулировать лимиты Telegram")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Простые in-process кэши бота.
+
+LRUCache — потокобезопасный LRU с TTL записей и счётчиками попаданий.
+ad_cards — кэш отрисованных карточек объявлений (текст + разобранные фото) по id.
+deleted_ads — недавно удалённые id: чтение, начатое до удаления, не должно вернуть объявление в кэш.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Dict, Hashable, Optional
+from .config import CARD_CACHE_SIZE, CARD_CACHE_TTL
+
+_MISSING = object()
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires = item
+                if expires is None or expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for k in keys:
+                del self._data[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+# text — готовый текст карточки, photos — file_id фото, media — готовые InputMediaPhoto
+# (с подписью, если текст в неё помещается), cursor — ключ объявления в выдаче поиска
+AdCard = namedtuple("AdCard", ["text", "photos", "media", "user_id", "cursor", "price"])
+
+ad_cards = LRUCache(CARD_CACHE_SIZE, CARD_CACHE_TTL)
+# id объявлений не переиспользуются, окно гонки — время одного запроса, поэтому хватает короткого TTL
+deleted_ads = LRUCache(CARD_CACHE_SIZE, 60)
@@ -11,6 +11,73 @@ ADMIN_ID = os.getenv("ADMIN_ID") or None
 CHANNEL_USERNAME = os.getenv("CHANNEL_USERNAME") or None
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 DB_PATH = os.getenv("DB_PATH", "bot.db")
+# Отдельный файл для архива объявлений (подключается через ATTACH); пусто — архив в основной БД
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH") or None
+# Пул соединений SQLite
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Максимум одновременных операций с БД из хендлеров
+DB_MAX_INFLIGHT = int(os.getenv("DB_MAX_INFLIGHT", "16"))
+# Кэш отрисованных карточек объявлений
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "5000"))
+CARD_CACHE_TTL = float(os.getenv("CARD_CACHE_TTL", "600"))
+# Режим получения обновлений: polling или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or None
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Сколько обновлений разных чатов обрабатывать одновременно
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+# Ограничение исходящих запросов к Bot API
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+RATE_GLOBAL_PER_SEC = float(os.getenv("RATE_GLOBAL_PER_SEC", "30"))
+RATE_CHAT_PER_SEC = float(os.getenv("RATE_CHAT_PER_SEC", "1"))
+RATE_CHAT_BURST = float(os.getenv("RATE_CHAT_BURST", "3"))
+RATE_GROUP_PER_MIN = float(os.getenv("RATE_GROUP_PER_MIN", "20"))
+RATE_MAX_RETRIES = int(os.getenv("RATE_MAX_RETRIES", "3"))
+# Размер пула HTTP-соединений к Bot API (по умолчанию в PTB — одно соединение на всё)
+BOT_CONNECTION_POOL_SIZE = int(os.getenv("BOT_CONNECTION_POOL_SIZE", "32"))
+# Листание поиска редактирует сообщение с результатом вместо отправки новых
+SEARCH_EDIT_IN_PLACE = os.getenv("SEARCH_EDIT_IN_PLACE", "1") not in ("0", "false", "no")
+# Кэш проверки подписки на канал: TTL (сек) для подписанных и неподписанных
+SUB_CACHE_TTL_POSITIVE = float(os.getenv("SUB_CACHE_TTL_POSITIVE", "3600"))
+SUB_CACHE_TTL_NEGATIVE = float(os.getenv("SUB_CACHE_TTL_NEGATIVE", "60"))
+SUB_CACHE_SIZE = int(os.getenv("SUB_CACHE_SIZE", "100000"))
+# Буфер записей пользователей (/start): размер карты известных, порог и интервал (сек) сброса пачки
+KNOWN_USERS_MAX = int(os.getenv("KNOWN_USERS_MAX", "200000"))
+USER_FLUSH_SIZE = int(os.getenv("USER_FLUSH_SIZE", "500"))
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "5"))
+# Фоновые уведомления: размер очереди и число отправляющих воркеров
+NOTIFY_QUEUE_SIZE = int(os.getenv("NOTIFY_QUEUE_SIZE", "10000"))
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "4"))
+# Подбор встречных объявлений (продажа <-> покупка) при публикации
+MATCH_ENABLED = os.getenv("MATCH_ENABLED", "1") not in ("0", "false", "no")
+MATCH_LIMIT = int(os.getenv("MATCH_LIMIT", "10"))
+# Сколько сохранённых поисков (/subscribe) может быть у одного пользователя
+SAVED_SEARCHES_PER_USER = int(os.getenv("SAVED_SEARCHES_PER_USER", "10"))
+# Срок жизни объявлений и закрепа; фоновая задача снимает закрепы и переносит истёкшие объявления в архив пачками
+AD_TTL_DAYS = float(os.getenv("AD_TTL_DAYS", "30"))
+PIN_HOURS = float(os.getenv("PIN_HOURS", "24"))
+EXPIRY_INTERVAL = float(os.getenv("EXPIRY_INTERVAL", "60"))
+EXPIRY_BATCH = int(os.getenv("EXPIRY_BATCH", "500"))
+# Сохранение user_data и состояний форм в БД между перезапусками; период (сек) и размер пачки записи
+PERSISTENCE_ENABLED = os.getenv("PERSISTENCE_ENABLED", "1") not in ("0", "false", "no")
+PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", "10"))
+PERSIST_BATCH = int(os.getenv("PERSIST_BATCH", "500"))
+# Таймаут незавершённой формы объявления (сек) и очистка user_data неактивных пользователей:
+# срок неактивности (сек), максимум пользователей с состоянием в памяти, период проверки (сек)
+CONVERSATION_TIMEOUT = float(os.getenv("CONVERSATION_TIMEOUT", "1800"))
+STATE_IDLE_TTL = float(os.getenv("STATE_IDLE_TTL", "21600"))
+STATE_MAX_USERS = int(os.getenv("STATE_MAX_USERS", "50000"))
+STATE_SWEEP_INTERVAL = float(os.getenv("STATE_SWEEP_INTERVAL", "300"))
+# Адрес Bot API (например, локальная заглушка benchmarks/fake_bot_api.py); по умолчанию api.telegram.org
+BOT_API_URL = os.getenv("BOT_API_URL") or None
 
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN не задан в .env")
@@ -19,4 +86,6 @@ if ADMIN_ID:
     try:
         ADMIN_ID = int(ADMIN_ID)
     except ValueError:
-        ADMIN_ID = None
\ No newline at end of file
+        ADMIN_ID = None
+if BOT_MODE not in ("polling", "webhook"):
+    raise RuntimeError("BOT_MODE должен быть polling или webhook")
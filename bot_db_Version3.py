@@ -1,30 +1,345 @@
 """
 SQLite helper для хранения пользователей и объявлений.
+
+Соединения берутся из небольшого пула долгоживущих соединений (WAL,
+synchronous=NORMAL), которые открываются один раз в init_db() и закрепляются
+за потоком, который их взял.
+
+Горячая таблица ads содержит только живые объявления; удалённые и истёкшие
+переносятся в ads_archive — в основной БД или в отдельном файле ARCHIVE_DB_PATH,
+подключённом к каждому соединению как схема archive.
+
+Поля объявления хранятся строками ad_fields (ключ — id из справочника field_keys),
+фото — строками ad_photos; объявление читается вместе с ними одним запросом
+(with_children_query) и собирается в dict с fields (dict) и photos (list).
 """
 import sqlite3
 import json
+import logging
+import queue
+import re
+import threading
 import time
-from typing import Optional, List, Dict
-from .config import DB_PATH
+from collections import namedtuple
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Iterable, Sequence
+from .prices import extract_prices
+from .config import DB_PATH, ARCHIVE_DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_BUSY_TIMEOUT_MS, AD_TTL_DAYS, PIN_HOURS
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """Пул соединений: каждый поток получает своё соединение и держит его до release()."""
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+        self.checkouts = 0
+        self.hits = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        for _ in range(self.size):
+            conn = self._open()
+            self._all.append(conn)
+            self._idle.put(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread=False: соединение создаётся в одном потоке, а используется в другом,
+        # но в каждый момент им владеет только один поток (см. acquire/release)
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+        if ARCHIVE_DB_PATH:
+            conn.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_DB_PATH,))
+            conn.execute("PRAGMA archive.journal_mode=WAL")
+            conn.execute("PRAGMA archive.synchronous=NORMAL")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            with self._lock:
+                self.hits += 1
+            return conn
+        waited = 0.0
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            start = time.perf_counter()
+            try:
+                conn = self._idle.get(timeout=DB_POOL_TIMEOUT)
+            except queue.Empty:
+                raise sqlite3.OperationalError(f"Пул соединений исчерпан: нет свободного соединения за {DB_POOL_TIMEOUT} с")
+            waited = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait = max(self.max_wait, waited)
+        self._local.conn = conn
+        return conn
+
+    def release(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
 
-def get_conn():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    def close(self):
+        for conn in self._all:
+            conn.close()
+        self._all = []
 
-def init_db():
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "hits": self.hits,
+                "waits": self.waits,
+                "wait_time_ms": round(self.wait_time * 1000, 3),
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+# SQLite допускает одного писателя; сериализуем запись внутри процесса, чтобы не крутиться на busy_timeout.
+# Читатели этот лок не берут и в режиме WAL писателя не ждут.
+_write_lock = threading.Lock()
+
+def _get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+    return _pool
+
+def get_conn() -> sqlite3.Connection:
+    """Соединение текущего потока (берётся из пула при первом обращении)."""
+    return _get_pool().acquire()
+
+def release_conn():
+    """Вернуть соединение текущего потока в пул."""
+    if _pool is not None:
+        _pool.release()
+
+@contextmanager
+def write_tx():
+    """Транзакция записи: commit при успехе, rollback при исключении."""
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
+    with _write_lock:
+        with conn:
+            yield conn
+
+def close_db():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def pool_stats() -> Dict:
+    return _pool.stats() if _pool is not None else {}
+
+SQL_GET_USER = "SELECT {columns} FROM users WHERE user_id = ?"
+SQL_UPDATE_USERNAME = "UPDATE users SET username = ? WHERE user_id = ? AND (username IS NULL OR username != ?)"
+SQL_SET_VIP = "UPDATE users SET vip = ? WHERE user_id = ?"
+SQL_UPSERT_USER = (
+    "INSERT INTO users(user_id, username) VALUES (?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username WHERE users.username IS NOT excluded.username"
+)
+SQL_GET_AD = "SELECT * FROM ads WHERE id = ?"
+SQL_INSERT_FIELD = "INSERT INTO ad_fields(ad_id, pos, key_id, value) VALUES (?, ?, ?, ?)"
+SQL_INSERT_PHOTO = "INSERT INTO ad_photos(ad_id, pos, file_id) VALUES (?, ?, ?)"
+SQL_SET_PIN = "UPDATE ads SET pinned = ?, pinned_until = ? WHERE id = ?"
+SQL_GET_USER_ADS = "SELECT {columns} FROM ads WHERE user_id = ? ORDER BY created_at DESC"
+SQL_EXPIRED_PINS = "SELECT id FROM ads WHERE pinned_until <= ? ORDER BY pinned_until LIMIT ?"
+SQL_EXPIRED_ADS = "SELECT id FROM ads WHERE expires_at <= ? ORDER BY expires_at LIMIT ?"
+SQL_GET_USER_STATE = "SELECT data FROM user_state WHERE user_id = ?"
+SQL_UPSERT_USER_STATE = (
+    "INSERT INTO user_state(user_id, data, updated_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at"
+)
+SQL_DELETE_USER_STATE = "DELETE FROM user_state WHERE user_id = ?"
+SQL_GET_CONVERSATIONS = "SELECT key, state FROM conversations WHERE name = ?"
+SQL_UPSERT_CONVERSATION = "INSERT OR REPLACE INTO conversations(name, key, state) VALUES (?, ?, ?)"
+SQL_DELETE_CONVERSATION = "DELETE FROM conversations WHERE name = ? AND key = ?"
+SQL_IMPORT_USER = (
+    "INSERT INTO users(user_id, username, vip) VALUES (?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, vip = excluded.vip"
+)
+SQL_DELETE_AD = "DELETE FROM ads WHERE id = ?"
+SQL_GET_IMPORT_PROGRESS = "SELECT position FROM import_progress WHERE source = ?"
+SQL_SET_IMPORT_PROGRESS = "INSERT OR REPLACE INTO import_progress(source, position, updated_at) VALUES (?, ?, ?)"
+SQL_ADS_AFTER = "SELECT * FROM ads WHERE id > ? ORDER BY id LIMIT ?"
+SQL_USERS_AFTER = "SELECT user_id, username, vip FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?"
+SQL_GET_USER_SAVED = "SELECT * FROM saved_searches WHERE user_id = ? ORDER BY id"
+SQL_DELETE_SAVED = "DELETE FROM saved_searches WHERE id = ? AND user_id = ?"
+
+# Колонки объявления, общие для ads и ads_archive
+AD_COLUMNS = (
+    "id, user_id, username, server, category, type, action, vip, pinned, created_at, "
+    "price, income, pinned_until, expires_at"
+)
+USER_COLUMNS = ("user_id", "username", "vip")
+# Краткое описание объявления (список «Мои объявления»): читается из индекса idx_ads_user_summary
+AD_SUMMARY = ("id", "server", "category", "type", "action")
+# В архиве поля и фото остаются JSON-текстом: архив читается редко и только списком
+ARCHIVE_FIELDS = (
+    "(SELECT json_group_object(name, value) FROM (SELECT k.name, f.value FROM ad_fields f "
+    "JOIN field_keys k ON k.id = f.key_id WHERE f.ad_id = ads.id ORDER BY f.pos))"
+)
+ARCHIVE_PHOTOS = "(SELECT json_group_array(file_id) FROM (SELECT file_id FROM ad_photos WHERE ad_id = ads.id ORDER BY pos))"
+
+# Архив объявлений; {schema} — main или archive (ARCHIVE_DB_PATH)
+ARCHIVE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {schema}.ads_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    username TEXT,
+    server TEXT,
+    category TEXT,
+    type TEXT,
+    action TEXT,
+    fields TEXT,
+    photos TEXT,
+    vip INTEGER,
+    pinned INTEGER,
+    created_at INTEGER,
+    price INTEGER,
+    income INTEGER,
+    pinned_until INTEGER,
+    expires_at INTEGER,
+    archived_at INTEGER,
+    reason TEXT
+)
+"""
+ARCHIVE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS {schema}.idx_archive_user ON ads_archive(user_id, archived_at)"
+ARCHIVE = "archive.ads_archive" if ARCHIVE_DB_PATH else "ads_archive"
+
+# Текст объявления для FTS: значения полей из JSON и тип; {t} — new в триггерах или ads при заполнении.
+# unicode61 не приводит «ё» к «е», поэтому это делается здесь и в fts_query().
+FTS_BODY = (
+    "replace(replace((SELECT group_concat(value, ' ') FROM json_each({t}.fields)) || ' ' || ifnull({t}.type, ''), "
+    "'ё', 'е'), 'Ё', 'Е')"
+)
+# То же после v8: значения берутся из ad_fields объявления {id}
+FTS_BODY_FIELDS = (
+    "replace(replace(ifnull((SELECT group_concat(value, ' ') FROM ad_fields WHERE ad_id = {id}), '') || ' ' || ifnull({t}.type, ''), "
+    "'ё', 'е'), 'Ё', 'Е')"
+)
+# Пересобрать строку FTS объявления {id} (после изменения его полей)
+FTS_REFRESH = f"""
+    DELETE FROM ads_fts WHERE rowid = {{id}};
+    INSERT INTO ads_fts(rowid, body, server, category, action)
+    SELECT id, {FTS_BODY_FIELDS.format(id="ads.id", t="ads")}, server, category, action FROM ads WHERE id = {{id}};
+"""
+
+def _refresh_fts(conn: sqlite3.Connection, ad_id: int):
+    """Пересобрать строку FTS объявления один раз после записи всех его полей (триггеров на вставку в ad_fields нет)."""
+    for sql in FTS_REFRESH.format(id="?").split(";"):
+        if sql.strip():
+            conn.execute(sql, (ad_id,))
+
+def _backfill_prices(conn: sqlite3.Connection, chunk: int = 1000):
+    """Заполнить price/income у существующих объявлений (разбор JSON полей пачками)."""
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, fields FROM ads WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            try:
+                fields = json.loads(row["fields"] or "{}")
+            except ValueError:
+                fields = {}
+            updates.append(extract_prices(fields) + (row["id"],))
+        conn.executemany("UPDATE ads SET price = ?, income = ? WHERE id = ?", updates)
+        last_id = rows[-1]["id"]
+
+def storage_size(conn: sqlite3.Connection) -> Dict:
+    """Размер основной БД: total — занятые страницы, по таблицам/индексам — байты данных (payload из dbstat, если доступен).
+
+    Место, освобождённое внутри страниц (например, DROP COLUMN), в total не возвращается до VACUUM, а в payload видно сразу.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    used = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+    size = {"total": used * page_size}
+    try:
+        for name, payload in conn.execute("SELECT name, sum(payload) FROM dbstat('main') GROUP BY name").fetchall():
+            size[name] = payload
+    except sqlite3.Error:
+        pass
+    return size
+
+def _convert_fields(conn: sqlite3.Connection, chunk: int = 1000):
+    """Перенести JSON fields/photos из ads в ad_fields/ad_photos и убрать старые колонки; пишет в лог размер до и после."""
+    before = storage_size(conn)
+    key_ids: Dict[str, int] = {}
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT id, fields, photos FROM ads WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)).fetchall()
+        if not rows:
+            break
+        field_rows, photo_rows = [], []
+        for row in rows:
+            try:
+                fields = json.loads(row["fields"] or "{}")
+                photos = json.loads(row["photos"] or "[]")
+            except ValueError:
+                fields, photos = {}, []
+            for pos, (name, value) in enumerate(fields.items()):
+                if name not in key_ids:
+                    conn.execute("INSERT OR IGNORE INTO field_keys(name) VALUES (?)", (name,))
+                    key_ids[name] = conn.execute("SELECT id FROM field_keys WHERE name = ?", (name,)).fetchone()[0]
+                field_rows.append((row["id"], pos, key_ids[name], str(value)))
+            photo_rows += [(row["id"], pos, file_id) for pos, file_id in enumerate(photos)]
+        conn.executemany(SQL_INSERT_FIELD, field_rows)
+        conn.executemany(SQL_INSERT_PHOTO, photo_rows)
+        last_id = rows[-1]["id"]
+    if sqlite3.sqlite_version_info >= (3, 35):
+        conn.execute("ALTER TABLE ads DROP COLUMN fields")
+        conn.execute("ALTER TABLE ads DROP COLUMN photos")
+    else:
+        # DROP COLUMN появился в SQLite 3.35: колонки остаются, но пустыми
+        conn.execute("UPDATE ads SET fields = NULL, photos = NULL")
+    after = storage_size(conn)
+    tables = ("ads", "ad_fields", "ad_photos", "field_keys")
+    logger.info(
+        "Поля объявлений перенесены в ad_fields/ad_photos: данные %s -> %s байт (%s), страницы %s -> %s байт (до VACUUM)",
+        sum(before.get(t, 0) for t in tables), sum(after.get(t, 0) for t in tables),
+        ", ".join(f"{t}: {before.get(t, 0)} -> {after.get(t, 0)}" for t in tables),
+        before["total"], after["total"],
+    )
+
+# Миграции схемы: номер версии хранится в PRAGMA user_version.
+# Шаг — SQL-строка или функция (conn) для переноса данных; каждая версия применяется в своей транзакции.
+MIGRATIONS = [
+    (1, [
         """
         CREATE TABLE IF NOT EXISTS users (
             user_id INTEGER PRIMARY KEY,
             username TEXT,
             vip INTEGER DEFAULT 0
         )
-        """
-    )
-    cur.execute(
+        """,
         """
         CREATE TABLE IF NOT EXISTS ads (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -40,68 +355,367 @@ def init_db():
             pinned INTEGER DEFAULT 0,
             created_at INTEGER
         )
+        """,
+    ]),
+    # Индексы под пути доступа get_ads() (с фильтром по действию и без) и get_user_ads().
+    # id (rowid) входит в каждый индекс, поэтому выборки id по ним не читают таблицу.
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_ads_search ON ads(server, category, action, pinned, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_ads_search_all ON ads(server, category, pinned, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_ads_user ON ads(user_id, created_at)",
+    ]),
+    # Полнотекстовый поиск по значениям полей и типу объявления. Таблица ads_fts хранит только текст
+    # (rowid = ads.id) и синхронизируется триггерами; prefix-индексы ускоряют запросы вида «инф*».
+    (3, [
         """
-    )
-    conn.commit()
-    conn.close()
+        CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+            body,
+            server UNINDEXED,
+            category UNINDEXED,
+            action UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ads_fts_ai AFTER INSERT ON ads BEGIN
+            INSERT INTO ads_fts(rowid, body, server, category, action)
+            VALUES (new.id, {FTS_BODY.format(t="new")}, new.server, new.category, new.action);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS ads_fts_ad AFTER DELETE ON ads BEGIN
+            DELETE FROM ads_fts WHERE rowid = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ads_fts_au AFTER UPDATE OF fields, type, server, category, action ON ads BEGIN
+            DELETE FROM ads_fts WHERE rowid = old.id;
+            INSERT INTO ads_fts(rowid, body, server, category, action)
+            VALUES (new.id, {FTS_BODY.format(t="new")}, new.server, new.category, new.action);
+        END
+        """,
+        f"INSERT INTO ads_fts(rowid, body, server, category, action) SELECT id, {FTS_BODY.format(t='ads')}, server, category, action FROM ads",
+    ]),
+    # Цена/бюджет и доход за день как целые числа (разбираются из полей в add_ad) — фильтр и сортировка по цене в SQL.
+    (4, [
+        "ALTER TABLE ads ADD COLUMN price INTEGER",
+        "ALTER TABLE ads ADD COLUMN income INTEGER",
+        _backfill_prices,
+        "CREATE INDEX IF NOT EXISTS idx_ads_price ON ads(server, category, action, price)",
+        "CREATE INDEX IF NOT EXISTS idx_ads_price_all ON ads(server, category, price)",
+    ]),
+    # Сохранённые поиски (/subscribe); при старте загружаются в память целиком (saved.SavedSearchIndex).
+    (5, [
+        """
+        CREATE TABLE IF NOT EXISTS saved_searches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            server TEXT,
+            category TEXT,
+            action TEXT,
+            price_min INTEGER,
+            price_max INTEGER,
+            created_at INTEGER
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_saved_user ON saved_searches(user_id)",
+    ]),
+    # Сроки: закреп до pinned_until, объявление живёт до expires_at, затем переносится в ads_archive.
+    # В ads остаются только живые объявления — по ним и идёт поиск.
+    (6, [
+        "ALTER TABLE ads ADD COLUMN pinned_until INTEGER",
+        "ALTER TABLE ads ADD COLUMN expires_at INTEGER",
+        f"UPDATE ads SET expires_at = created_at + {int(AD_TTL_DAYS * 86400)}",
+        f"UPDATE ads SET pinned_until = CAST(strftime('%s', 'now') AS INTEGER) + {int(PIN_HOURS * 3600)} WHERE pinned = 1",
+        "CREATE INDEX IF NOT EXISTS idx_ads_expires ON ads(expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_ads_pinned_until ON ads(pinned_until) WHERE pinned_until IS NOT NULL",
+        ARCHIVE_TABLE_SQL.format(schema="main"),
+        ARCHIVE_INDEX_SQL.format(schema="main"),
+    ]),
+    # Состояние диалогов между перезапусками (persistence.SQLitePersistence): user_data в JSON и
+    # состояния ConversationHandler. user_data читается по одному пользователю при первом обращении.
+    (7, [
+        """
+        CREATE TABLE IF NOT EXISTS user_state (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            PRIMARY KEY (name, key)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    # Поля и фото — отдельными строками вместо JSON в ads: ключи полей хранятся один раз в field_keys,
+    # строки объявления лежат рядом в первичном ключе (ad_id, pos). FTS теперь собирается из ad_fields.
+    (8, [
+        """
+        CREATE TABLE IF NOT EXISTS field_keys (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ad_fields (
+            ad_id INTEGER NOT NULL,
+            pos INTEGER NOT NULL,
+            key_id INTEGER NOT NULL,
+            value TEXT,
+            PRIMARY KEY (ad_id, pos)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ad_photos (
+            ad_id INTEGER NOT NULL,
+            pos INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            PRIMARY KEY (ad_id, pos)
+        ) WITHOUT ROWID
+        """,
+        # старые триггеры ссылаются на ads.fields и не дали бы удалить колонку
+        "DROP TRIGGER IF EXISTS ads_fts_ai",
+        "DROP TRIGGER IF EXISTS ads_fts_au",
+        _convert_fields,
+        # поля вставляются после строки ads (нужен её id), поэтому текст FTS дособирается триггерами ad_fields
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ads_fts_ai AFTER INSERT ON ads BEGIN
+            INSERT INTO ads_fts(rowid, body, server, category, action)
+            VALUES (new.id, {FTS_BODY_FIELDS.format(id="new.id", t="new")}, new.server, new.category, new.action);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ads_fts_au AFTER UPDATE OF type, server, category, action ON ads BEGIN
+            {FTS_REFRESH.format(id="new.id")}
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS ads_children_ad AFTER DELETE ON ads BEGIN
+            DELETE FROM ad_fields WHERE ad_id = old.id;
+            DELETE FROM ad_photos WHERE ad_id = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ad_fields_fts_ai AFTER INSERT ON ad_fields BEGIN
+            {FTS_REFRESH.format(id="new.ad_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ad_fields_fts_au AFTER UPDATE ON ad_fields BEGIN
+            {FTS_REFRESH.format(id="new.ad_id")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS ad_fields_fts_ad AFTER DELETE ON ad_fields BEGIN
+            {FTS_REFRESH.format(id="old.ad_id")}
+        END
+        """,
+    ]),
+    # «Мои объявления» читаются целиком из индекса (id — rowid, входит в индекс); заменяет idx_ads_user.
+    (9, [
+        "CREATE INDEX IF NOT EXISTS idx_ads_user_summary ON ads(user_id, created_at, server, category, type, action)",
+        "DROP INDEX IF EXISTS idx_ads_user",
+    ]),
+    # Отметки загрузки python -m bot.tools import: сколько строк файла уже записано (для продолжения после сбоя).
+    (10, [
+        """
+        CREATE TABLE IF NOT EXISTS import_progress (
+            source TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            updated_at INTEGER
+        ) WITHOUT ROWID
+        """,
+    ]),
+    # Триггеры на вставку/изменение ad_fields пересобирали строку FTS на каждое поле (и оставляли в FTS5
+    # удалённые версии документа). Теперь add_ad пересобирает её один раз после всех полей (_refresh_fts),
+    # import_ads пишет поля до строки ads; удаление полей по-прежнему обновляет FTS триггером.
+    (11, [
+        "DROP TRIGGER IF EXISTS ad_fields_fts_ai",
+        "DROP TRIGGER IF EXISTS ad_fields_fts_au",
+    ]),
+]
 
-def ensure_user(user_id: int, username: Optional[str]):
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+# Проекции: строки — namedtuple (кортеж со __slots__ = ()) вместо dict на каждую строку
+_row_types: Dict[tuple, type] = {}
+
+def projection(columns: Sequence[str], allowed: Sequence[str]) -> tuple:
+    """Проверить список колонок (он подставляется в SQL) и вернуть его кортежем."""
+    columns = tuple(columns)
+    unknown = [c for c in columns if c not in allowed]
+    if not columns or unknown:
+        raise ValueError(f"Недопустимые колонки: {unknown or 'пустой список'}")
+    return columns
+
+def _row_factory(columns: tuple):
+    row_type = _row_types.get(columns)
+    if row_type is None:
+        row_type = _row_types[columns] = namedtuple("Row", columns)
+    return lambda cursor, row: row_type._make(row)
+
+def _fetch_rows(sql: str, params, columns: tuple) -> list:
+    cur = get_conn().cursor()
+    cur.row_factory = _row_factory(columns)
+    return cur.execute(sql, params).fetchall()
+
+def migrate(conn: sqlite3.Connection):
+    with _write_lock:
+        current = schema_version(conn)
+        for version, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info("Схема БД обновлена до версии %s", version)
+
+def init_archive(conn: sqlite3.Connection, batch: int = 1000):
+    """Создать архив в подключённом файле и перенести туда архив из основной БД (если он там был)."""
+    with _write_lock:
+        with conn:
+            conn.execute(ARCHIVE_TABLE_SQL.format(schema="archive"))
+            conn.execute(ARCHIVE_INDEX_SQL.format(schema="archive"))
+        while True:
+            # в WAL транзакция над двумя файлами атомарна для каждого по отдельности;
+            # INSERT OR REPLACE делает повтор после сбоя безопасным
+            with conn:
+                ids = [r[0] for r in conn.execute("SELECT id FROM main.ads_archive ORDER BY id LIMIT ?", (batch,)).fetchall()]
+                if not ids:
+                    break
+                marks = ", ".join("?" * len(ids))
+                conn.execute(f"INSERT OR REPLACE INTO archive.ads_archive SELECT * FROM main.ads_archive WHERE id IN ({marks})", ids)
+                conn.execute(f"DELETE FROM main.ads_archive WHERE id IN ({marks})", ids)
+
+# Справочник ключей полей: имя -> id (только закоммиченные строки field_keys)
+_field_keys: Dict[str, int] = {}
+
+def intern_field_keys(names: Iterable[str]) -> Dict[str, int]:
+    """id ключей полей; новые ключи добавляются в field_keys отдельной транзакцией."""
+    names = list(dict.fromkeys(names))
+    missing = [n for n in names if n not in _field_keys]
+    if missing:
+        with write_tx() as conn:
+            conn.executemany("INSERT OR IGNORE INTO field_keys(name) VALUES (?)", [(n,) for n in missing])
+            marks = ", ".join("?" * len(missing))
+            found = conn.execute(f"SELECT name, id FROM field_keys WHERE name IN ({marks})", missing).fetchall()
+        _field_keys.update((name, key_id) for name, key_id in found)
+    return {n: _field_keys[n] for n in names}
+
+def init_db(field_keys: Iterable[str] = ()):
+    """Миграции, архив, справочник ключей полей (field_keys — ключи шаблонов формы) и проверка планов."""
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO users(user_id, username) VALUES (?, ?)", (user_id, username))
-    # update username if changed
-    cur.execute("UPDATE users SET username = ? WHERE user_id = ? AND (username IS NULL OR username != ?)", (username, user_id, username))
-    conn.commit()
-    conn.close()
+    migrate(conn)
+    if ARCHIVE_DB_PATH:
+        init_archive(conn)
+    _field_keys.clear()
+    _field_keys.update((name, key_id) for name, key_id in conn.execute("SELECT name, id FROM field_keys").fetchall())
+    intern_field_keys(field_keys)
+    for problem in check_query_plans(conn):
+        logger.warning("План запроса без индекса: %s", problem)
+    release_conn()
+
+def ensure_user(user_id: int, username: Optional[str]):
+    with write_tx() as conn:
+        conn.execute("INSERT OR IGNORE INTO users(user_id, username) VALUES (?, ?)", (user_id, username))
+        # update username if changed
+        conn.execute(SQL_UPDATE_USERNAME, (username, user_id, username))
+
+def ensure_users(rows: List[tuple]):
+    """Пачка (user_id, username) одной транзакцией: новые добавляются, у существующих обновляется username."""
+    with write_tx() as conn:
+        conn.executemany(SQL_UPSERT_USER, rows)
 
 def set_vip(user_id: int, vip: bool = True):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO users(user_id, username) VALUES (?, ?)", (user_id, None))
-    cur.execute("UPDATE users SET vip = ? WHERE user_id = ?", (1 if vip else 0, user_id))
-    conn.commit()
-    conn.close()
+    with write_tx() as conn:
+        conn.execute("INSERT OR IGNORE INTO users(user_id, username) VALUES (?, ?)", (user_id, None))
+        conn.execute(SQL_SET_VIP, (1 if vip else 0, user_id))
 
-def get_user(user_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    return dict(row) if row else None
+def get_user(user_id: int, columns: Sequence[str] = USER_COLUMNS):
+    """Пользователь (namedtuple с колонками columns) или None."""
+    columns = projection(columns, USER_COLUMNS)
+    rows = _fetch_rows(SQL_GET_USER.format(columns=", ".join(columns)), (user_id,), columns)
+    return rows[0] if rows else None
 
 def add_ad(user_id: int, username: str, server: str, category: str, type_: str, action: str, fields: Dict, photos: List[str], vip: bool=False, pinned: bool=False) -> int:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO ads(user_id, username, server, category, type, action, fields, photos, vip, pinned, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (user_id, username, server, category, type_, action, json.dumps(fields, ensure_ascii=False), json.dumps(photos), 1 if vip else 0, 1 if pinned else 0, int(time.time())),
+    price, income = extract_prices(fields)
+    key_ids = intern_field_keys(fields)
+    now = int(time.time())
+    pinned_until = now + int(PIN_HOURS * 3600) if pinned else None
+    with write_tx() as conn:
+        cur = conn.execute(
+            "INSERT INTO ads(user_id, username, server, category, type, action, vip, pinned, created_at, price, income, pinned_until, expires_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, username, server, category, type_, action, 1 if vip else 0, 1 if pinned else 0, now,
+             price, income, pinned_until, now + int(AD_TTL_DAYS * 86400)),
+        )
+        ad_id = cur.lastrowid
+        conn.executemany(SQL_INSERT_FIELD, [(ad_id, pos, key_ids[k], str(v)) for pos, (k, v) in enumerate(fields.items())])
+        if fields:
+            # строка ads вставлена раньше полей (нужен её id) — текст FTS дособирается один раз
+            _refresh_fts(conn, ad_id)
+        conn.executemany(SQL_INSERT_PHOTO, [(ad_id, pos, file_id) for pos, file_id in enumerate(photos)])
+        return ad_id
+
+def with_children_query(q: str) -> str:
+    """Объявления из запроса q вместе с полями и фото одним запросом.
+
+    Результат q материализуется один раз; строки полей и фото добавляются через UNION ALL
+    поиском по первичному ключу (ad_id, pos). Собирается обратно в _assemble().
+    """
+    return (
+        f"WITH a AS ({q}) "
+        "SELECT a.*, 0 AS kind, NULL AS pos, NULL AS name, NULL AS value FROM a "
+        "UNION ALL SELECT a.*, 1, f.pos, k.name, f.value FROM a JOIN ad_fields f ON f.ad_id = a.id JOIN field_keys k ON k.id = f.key_id "
+        "UNION ALL SELECT a.*, 2, p.pos, NULL, p.file_id FROM a JOIN ad_photos p ON p.ad_id = a.id"
     )
-    ad_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return ad_id
+
+def _assemble(rows) -> Dict[int, Dict]:
+    """Строки with_children_query -> {id: ad} с ad["fields"] (dict в порядке формы) и ad["photos"] (list)."""
+    ads: Dict[int, Dict] = {}
+    fields: Dict[int, list] = {}
+    photos: Dict[int, list] = {}
+    for r in rows:
+        ad_id, kind = r["id"], r["kind"]
+        if kind == 0:
+            ad = dict(r)
+            for k in ("kind", "pos", "name", "value"):
+                del ad[k]
+            ads[ad_id] = ad
+        elif kind == 1:
+            fields.setdefault(ad_id, []).append((r["pos"], r["name"], r["value"]))
+        else:
+            photos.setdefault(ad_id, []).append((r["pos"], r["value"]))
+    for ad_id, ad in ads.items():
+        ad["fields"] = {name: value for _, name, value in sorted(fields.get(ad_id, ()))}
+        ad["photos"] = [file_id for _, file_id in sorted(photos.get(ad_id, ()))]
+    return ads
 
 def get_ad(ad_id: int) -> Optional[Dict]:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM ads WHERE id = ?", (ad_id,))
-    row = cur.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    return _assemble(get_conn().execute(with_children_query(SQL_GET_AD), (ad_id,)).fetchall()).get(ad_id)
 
 def delete_ad(ad_id: int) -> bool:
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM ads WHERE id = ?", (ad_id,))
-    changed = cur.rowcount
-    conn.commit()
-    conn.close()
-    return changed > 0
-
-def get_ads(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, limit: int=100, include_pinned_first: bool=True) -> List[Dict]:
-    conn = get_conn()
-    cur = conn.cursor()
+    """Убрать объявление из горячей таблицы в архив (reason="deleted")."""
+    with write_tx() as conn:
+        return _archive(conn, [ad_id], "deleted") > 0
+
+def ads_query(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, limit: int=100, include_pinned_first: bool=True,
+              columns: Sequence[str] = ("*",)):
     where = []
     params = []
     if server:
@@ -113,30 +727,392 @@ def get_ads(server: Optional[str]=None, category: Optional[str]=None, action: Op
     if action:
         where.append("action = ?")
         params.append(action)
-    q = "SELECT * FROM ads"
+    q = f"SELECT {', '.join(columns)} FROM ads"
     if where:
         q += " WHERE " + " AND ".join(where)
     if include_pinned_first:
         q += " ORDER BY pinned DESC, created_at DESC"
     else:
         q += " ORDER BY created_at DESC"
-    q += f" LIMIT {limit}"
-    cur.execute(q, params)
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    q += f" LIMIT {int(limit)}"
+    return q, params
+
+def get_ads(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, limit: int=100, include_pinned_first: bool=True,
+            columns: Optional[Sequence[str]] = None) -> list:
+    """Объявления целиком (dict с fields/photos) или, если задан columns, только эти колонки (namedtuple).
+
+    Проекция ("id",) и колонки ключа сортировки читаются из индекса поиска, не трогая таблицу.
+    """
+    if columns is not None:
+        columns = projection(columns, AD_COLUMNS.split(", "))
+        q, params = ads_query(server, category, action, limit, include_pinned_first, columns)
+        return _fetch_rows(q, params, columns)
+    q, params = ads_query(server, category, action, limit, include_pinned_first)
+    ads = _assemble(get_conn().execute(with_children_query(q), params).fetchall())
+    # порядок UNION ALL не гарантирован — восстанавливаем порядок выдачи
+    keys = ("pinned", "created_at") if include_pinned_first else ("created_at",)
+    return sorted(ads.values(), key=lambda ad: tuple(ad[k] for k in keys), reverse=True)
+
+# Порядок выдачи поиска: sort -> (ключ курсора, направление «вперёд»)
+SORT_KEYS = {
+    "date": (("pinned", "created_at", "id"), "DESC"),
+    "price": (("price", "id"), "ASC"),
+}
+
+def ad_cursor(ad: Dict, sort: str = "date") -> tuple:
+    """Ключ объявления в порядке выдачи поиска: (pinned, created_at, id) или (price, id) для sort="price"."""
+    return tuple(ad[k] for k in SORT_KEYS[sort][0])
+
+def ads_page_query(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, cursor: Optional[tuple]=None, direction: str="next", limit: int=2,
+                   sort: str="date", price_min: Optional[int]=None, price_max: Optional[int]=None, columns: Sequence[str] = ("*",)):
+    where = []
+    params = []
+    if server:
+        where.append("server = ?")
+        params.append(server)
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if action:
+        where.append("action = ?")
+        params.append(action)
+    keys, forward_order = SORT_KEYS[sort]
+    # при сортировке по дате диапазон цен проверяется по строкам, а порядок даёт индекс поиска
+    # ("+price" не даёт планировщику взять idx_ads_price и сортировать во временном B-дереве)
+    price_col = "price" if sort == "price" else "+price"
+    if price_min is not None:
+        where.append(f"{price_col} >= ?")
+        params.append(price_min)
+    if price_max is not None:
+        where.append(f"{price_col} <= ?")
+        params.append(price_max)
+    if sort == "price" and price_min is None and price_max is None:
+        # объявления без распознанной цены в сортировку по цене не попадают
+        where.append("price IS NOT NULL")
+    forward = direction == "next"
+    if cursor:
+        op = "<" if (forward_order == "DESC") == forward else ">"
+        where.append(f"({', '.join(keys)}) {op} ({', '.join('?' * len(keys))})")
+        params.extend(cursor)
+    order = forward_order if forward else ("ASC" if forward_order == "DESC" else "DESC")
+    q = f"SELECT {', '.join(columns)} FROM ads"
+    if where:
+        q += " WHERE " + " AND ".join(where)
+    q += " ORDER BY " + ", ".join(f"{k} {order}" for k in keys) + f" LIMIT {int(limit)}"
+    return q, params
+
+def get_ads_page(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, cursor: Optional[tuple]=None, direction: str="next",
+                 sort: str="date", price_min: Optional[int]=None, price_max: Optional[int]=None):
+    """id следующего (или предыдущего) объявления после cursor.
+
+    Два id выдачи читаются только из индекса (второй нужен лишь как признак «есть ещё»).
+    Само объявление вызывающий берёт из кэша карточек, а при промахе — get_ad(id).
+    Возвращает (id или None, есть_ли_ещё_в_этом_направлении).
+    """
+    q, params = ads_page_query(server, category, action, cursor, direction, 2, sort, price_min, price_max, ("id",))
+    ids = [r[0] for r in get_conn().execute(q, params).fetchall()]
+    if not ids:
+        return None, False
+    return ids[0], len(ids) > 1
+
+def matches_query(server: str, category: str, action: str, price: int, user_id: int, limit: int=10):
+    """Встречные объявления для нового: продаже подходят покупки с бюджетом >= цены, покупке — продажи с ценой <= бюджета.
+
+    Идёт по idx_ads_price (server, category, action, price): диапазон цены — часть ключа индекса.
+    """
+    if action == "sell":
+        opposite, cond = "buy", "price >= ?"
+    else:
+        opposite, cond = "sell", "price <= ?"
+    q = (
+        "SELECT id, user_id, server, category, type, action, price FROM ads "
+        f"WHERE server = ? AND category = ? AND action = ? AND {cond} AND user_id != ? "
+        f"ORDER BY price ASC LIMIT {int(limit)}"
+    )
+    return q, [server, category, opposite, price, user_id]
+
+def find_matches(ad: Dict, limit: int=10) -> List[Dict]:
+    if ad.get("price") is None:
+        return []
+    q, params = matches_query(ad["server"], ad["category"], ad["action"], ad["price"], ad["user_id"], limit)
+    return [dict(r) for r in get_conn().execute(q, params).fetchall()]
+
+def fts_query(text: str) -> Optional[str]:
+    """Запрос пользователя -> выражение FTS5: каждое слово как префикс, все слова обязательны."""
+    words = re.findall(r"\w+", text.replace("ё", "е").replace("Ё", "Е"))
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words[:16])
+
+def search_ads_query(match: str, server: Optional[str]=None, category: Optional[str]=None, limit: int=10, offset: int=0):
+    where = ["ads_fts MATCH ?"]
+    params = [match]
+    if server:
+        where.append("ads_fts.server = ?")
+        params.append(server)
+    if category:
+        where.append("ads_fts.category = ?")
+        params.append(category)
+    q = (
+        "SELECT a.id, a.server, a.category, a.type, a.action, a.pinned, "
+        "snippet(ads_fts, 0, '', '', '…', 10) AS snippet "
+        "FROM ads_fts JOIN ads a ON a.id = ads_fts.rowid WHERE " + " AND ".join(where)
+        + f" ORDER BY rank LIMIT {int(limit)} OFFSET {int(offset)}"
+    )
+    return q, params
+
+def search_ads(text: str, server: Optional[str]=None, category: Optional[str]=None, limit: int=10, offset: int=0):
+    """Полнотекстовый поиск по объявлениям (bm25). Возвращает (список, есть_ли_ещё)."""
+    match = fts_query(text)
+    if match is None:
+        return [], False
+    q, params = search_ads_query(match, server, category, limit + 1, offset)
+    rows = get_conn().execute(q, params).fetchall()
+    return [dict(r) for r in rows[:limit]], len(rows) > limit
+
+def get_user_ads(user_id: int, columns: Sequence[str] = AD_SUMMARY) -> list:
+    """Объявления пользователя, новые сначала (namedtuple с колонками columns; по умолчанию — из индекса)."""
+    columns = projection(columns, AD_COLUMNS.split(", "))
+    return _fetch_rows(SQL_GET_USER_ADS.format(columns=", ".join(columns)), (user_id,), columns)
+
+def set_pin(ad_id: int, pinned: bool=True, hours: Optional[float]=None) -> bool:
+    """Закрепить на hours часов (по умолчанию PIN_HOURS) или открепить."""
+    pinned_until = int(time.time() + (hours if hours is not None else PIN_HOURS) * 3600) if pinned else None
+    with write_tx() as conn:
+        return conn.execute(SQL_SET_PIN, (1 if pinned else 0, pinned_until, ad_id)).rowcount > 0
+
+def unpin_expired(now: int, batch: int=500) -> List[int]:
+    """Снять истёкшие закрепы (не больше batch за транзакцию). Возвращает id объявлений."""
+    with write_tx() as conn:
+        ids = [r[0] for r in conn.execute(SQL_EXPIRED_PINS, (now, batch)).fetchall()]
+        if ids:
+            conn.executemany("UPDATE ads SET pinned = 0, pinned_until = NULL WHERE id = ?", [(i,) for i in ids])
+        return ids
+
+def _archive(conn: sqlite3.Connection, ids: List[int], reason: str) -> int:
+    """Перенести объявления ids из ads в архив внутри текущей транзакции. Возвращает число перенесённых."""
+    marks = ", ".join("?" * len(ids))
+    conn.execute(
+        f"INSERT OR REPLACE INTO {ARCHIVE}({AD_COLUMNS}, fields, photos, archived_at, reason) "
+        f"SELECT {AD_COLUMNS}, {ARCHIVE_FIELDS}, {ARCHIVE_PHOTOS}, ?, ? FROM ads WHERE id IN ({marks})",
+        [int(time.time()), reason, *ids],
+    )
+    return conn.execute(f"DELETE FROM ads WHERE id IN ({marks})", ids).rowcount
+
+def user_archive_query(user_id: int, limit: int=20):
+    return (
+        f"SELECT id, server, category, type, action, price, created_at, archived_at, reason FROM {ARCHIVE} "
+        f"WHERE user_id = ? ORDER BY archived_at DESC LIMIT {int(limit)}"
+    ), [user_id]
+
+def get_user_archive(user_id: int, limit: int=20) -> List[Dict]:
+    """Последние объявления пользователя из архива (горячую таблицу не трогает)."""
+    q, params = user_archive_query(user_id, limit)
+    return [dict(r) for r in get_conn().execute(q, params).fetchall()]
+
+def archive_expired(now: int, batch: int=500) -> List[int]:
+    """Перенести истёкшие объявления в ads_archive (не больше batch за транзакцию). Возвращает id."""
+    with write_tx() as conn:
+        ids = [r[0] for r in conn.execute(SQL_EXPIRED_ADS, (now, batch)).fetchall()]
+        if ids:
+            _archive(conn, ids, "expired")
+        return ids
+
+def add_saved_search(user_id: int, server: Optional[str], category: Optional[str], action: Optional[str], price_min: Optional[int]=None, price_max: Optional[int]=None) -> Dict:
+    with write_tx() as conn:
+        cur = conn.execute(
+            "INSERT INTO saved_searches(user_id, server, category, action, price_min, price_max, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, server, category, action, price_min, price_max, int(time.time())),
+        )
+        return dict(conn.execute("SELECT * FROM saved_searches WHERE id = ?", (cur.lastrowid,)).fetchone())
+
+def delete_saved_search(search_id: int, user_id: int) -> bool:
+    with write_tx() as conn:
+        return conn.execute(SQL_DELETE_SAVED, (search_id, user_id)).rowcount > 0
 
-def get_user_ads(user_id: int) -> List[Dict]:
+def get_user_saved_searches(user_id: int) -> List[Dict]:
+    return [dict(r) for r in get_conn().execute(SQL_GET_USER_SAVED, (user_id,)).fetchall()]
+
+def iter_saved_searches(chunk: int = 5000):
+    """Все сохранённые поиски пачками по id (загрузка индекса при старте)."""
+    conn = get_conn()
+    last_id = 0
+    while True:
+        rows = conn.execute("SELECT * FROM saved_searches WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk)).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield dict(r)
+        last_id = rows[-1]["id"]
+
+def iter_ads(chunk: int = 1000):
+    """Все объявления целиком (с fields/photos) по возрастанию id, пачками — для выгрузки."""
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM ads WHERE user_id = ? ORDER BY created_at DESC", (user_id,))
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    last_id = 0
+    while True:
+        ads = _assemble(conn.execute(with_children_query(SQL_ADS_AFTER), (last_id, chunk)).fetchall())
+        if not ads:
+            return
+        for ad_id in sorted(ads):
+            yield ads[ad_id]
+        last_id = max(ads)
 
-def set_pin(ad_id: int, pinned: bool=True):
+def iter_users(chunk: int = 5000):
+    """Все пользователи по возрастанию user_id, пачками — для выгрузки."""
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("UPDATE ads SET pinned = ? WHERE id = ?", (1 if pinned else 0, ad_id))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    last_id = 0
+    while True:
+        rows = conn.execute(SQL_USERS_AFTER, (last_id, chunk)).fetchall()
+        if not rows:
+            return
+        for r in rows:
+            yield dict(r)
+        last_id = rows[-1]["user_id"]
+
+def get_import_progress(source: str) -> int:
+    row = get_conn().execute(SQL_GET_IMPORT_PROGRESS, (source,)).fetchone()
+    return row[0] if row else 0
+
+def set_import_progress(source: str, position: int):
+    with write_tx() as conn:
+        conn.execute(SQL_SET_IMPORT_PROGRESS, (source, position, int(time.time())))
+
+def import_ads(ads: List[Dict], progress: Optional[tuple] = None) -> int:
+    """Записать пачку объявлений с их id одной транзакцией; объявления с теми же id заменяются.
+
+    Недостающие price/income разбираются из полей, expires_at — от created_at.
+    progress — (source, позиция): отметка import_progress в той же транзакции.
+    """
+    key_ids = intern_field_keys(k for ad in ads for k in (ad.get("fields") or {}))
+    now = int(time.time())
+    columns = AD_COLUMNS.split(", ")
+    rows, field_rows, photo_rows = [], [], []
+    for ad in ads:
+        ad = dict(ad)
+        fields = ad.get("fields") or {}
+        price, income = extract_prices(fields)
+        ad.setdefault("price", price)
+        ad.setdefault("income", income)
+        ad["created_at"] = ad.get("created_at") or now
+        if ad.get("expires_at") is None:
+            ad["expires_at"] = ad["created_at"] + int(AD_TTL_DAYS * 86400)
+        ad["vip"] = ad.get("vip") or 0
+        ad["pinned"] = ad.get("pinned") or 0
+        rows.append(tuple(ad.get(c) for c in columns))
+        field_rows += [(ad["id"], pos, key_ids[k], str(v)) for pos, (k, v) in enumerate(fields.items())]
+        photo_rows += [(ad["id"], pos, file_id) for pos, file_id in enumerate(ad.get("photos") or [])]
+    with write_tx() as conn:
+        # DELETE (а не INSERT OR REPLACE) — чтобы триггеры убрали старые поля, фото и строку FTS
+        conn.executemany(SQL_DELETE_AD, [(r[0],) for r in rows])
+        # поля пишутся до строк ads: тогда текст FTS собирается один раз триггером вставки в ads
+        conn.executemany(SQL_INSERT_FIELD, field_rows)
+        conn.executemany(SQL_INSERT_PHOTO, photo_rows)
+        conn.executemany(f"INSERT INTO ads({AD_COLUMNS}) VALUES ({', '.join('?' * len(columns))})", rows)
+        if progress:
+            conn.execute(SQL_SET_IMPORT_PROGRESS, (*progress, now))
+    return len(rows)
+
+def import_users(users: List[Dict], progress: Optional[tuple] = None) -> int:
+    """Записать пачку пользователей одной транзакцией (существующие обновляются)."""
+    with write_tx() as conn:
+        conn.executemany(SQL_IMPORT_USER, [(u["user_id"], u.get("username"), u.get("vip") or 0) for u in users])
+        if progress:
+            conn.execute(SQL_SET_IMPORT_PROGRESS, (*progress, int(time.time())))
+    return len(users)
+
+def get_user_state(user_id: int) -> Optional[str]:
+    row = get_conn().execute(SQL_GET_USER_STATE, (user_id,)).fetchone()
+    return row[0] if row else None
+
+def save_state(users: List[tuple], dropped_users: List[int], conversations: List[tuple], dropped_conversations: List[tuple]):
+    """Записать пачку изменений состояния одной транзакцией.
+
+    users — (user_id, json), conversations — (name, key, json), dropped_* — что удалить.
+    """
+    now = int(time.time())
+    with write_tx() as conn:
+        if users:
+            conn.executemany(SQL_UPSERT_USER_STATE, [(uid, data, now) for uid, data in users])
+        if dropped_users:
+            conn.executemany(SQL_DELETE_USER_STATE, [(uid,) for uid in dropped_users])
+        if conversations:
+            conn.executemany(SQL_UPSERT_CONVERSATION, conversations)
+        if dropped_conversations:
+            conn.executemany(SQL_DELETE_CONVERSATION, dropped_conversations)
+
+def get_conversations(name: str) -> List[tuple]:
+    return [(r[0], r[1]) for r in get_conn().execute(SQL_GET_CONVERSATIONS, (name,)).fetchall()]
+
+def _children(case):
+    q, params = case
+    return with_children_query(q), params
+
+def query_plan_cases():
+    """Запросы, которые выполняет бот, с примерными параметрами — для проверки планов."""
+    ID = ("id",)
+    return [
+        ("get_user", SQL_GET_USER.format(columns=", ".join(USER_COLUMNS)), (1,)),
+        ("ensure_user", SQL_UPDATE_USERNAME, ("u", 1, "u")),
+        ("set_vip", SQL_SET_VIP, (1, 1)),
+        ("ensure_users", SQL_UPSERT_USER, (1, "u")),
+        ("get_ad", with_children_query(SQL_GET_AD), (1,)),
+        ("add_ad(field)", SQL_INSERT_FIELD, (1, 0, 1, "x")),
+        ("add_ad(fts)", FTS_REFRESH.format(id="?").split(";")[1], (1,)),
+        ("add_ad(photo)", SQL_INSERT_PHOTO, (1, 0, "x")),
+        ("delete_ad", "DELETE FROM ads WHERE id IN (?)", (1,)),
+        ("archive(fields)", f"SELECT {ARCHIVE_FIELDS}, {ARCHIVE_PHOTOS} FROM ads WHERE id IN (?)", (1,)),
+        ("set_pin", SQL_SET_PIN, (1, None, 1)),
+        ("unpin_expired", SQL_EXPIRED_PINS, (1, 500)),
+        ("archive_expired", SQL_EXPIRED_ADS, (1, 500)),
+        ("get_user_archive",) + user_archive_query(1),
+        ("get_user_ads", SQL_GET_USER_ADS.format(columns=", ".join(AD_SUMMARY)), (1,)),
+        ("get_user_state", SQL_GET_USER_STATE, (1,)),
+        ("save_state(user)", SQL_UPSERT_USER_STATE, (1, "{}", 1)),
+        ("save_state(drop user)", SQL_DELETE_USER_STATE, (1,)),
+        ("get_conversations", SQL_GET_CONVERSATIONS, ("ad_form",)),
+        ("save_state(conversation)", SQL_UPSERT_CONVERSATION, ("ad_form", "[1, 1]", "1")),
+        ("save_state(drop conversation)", SQL_DELETE_CONVERSATION, ("ad_form", "[1, 1]")),
+        ("get_user_saved_searches", SQL_GET_USER_SAVED, (1,)),
+        ("delete_saved_search", SQL_DELETE_SAVED, (1, 1)),
+        ("get_ads(server, category, action)",) + _children(ads_query("TEXAS", "Машина", "sell")),
+        ("get_ads(server, category)",) + _children(ads_query("TEXAS", "Машина", None)),
+        ("get_ads(id)",) + ads_query("TEXAS", "Машина", "sell", columns=ID),
+        ("get_ads_page(first)",) + ads_page_query("TEXAS", "Машина", "sell", columns=ID),
+        ("get_ads_page(next)",) + ads_page_query("TEXAS", "Машина", "sell", (0, 1, 1), "next", columns=ID),
+        ("get_ads_page(prev, all)",) + ads_page_query("TEXAS", "Машина", None, (0, 1, 1), "prev", columns=ID),
+        ("get_ads_page(range)",) + ads_page_query("TEXAS", "Машина", "sell", price_min=10, price_max=1000, columns=ID),
+        ("get_ads_page(price)",) + ads_page_query("TEXAS", "Машина", "sell", sort="price", columns=ID),
+        ("get_ads_page(price, next, range)",) + ads_page_query("TEXAS", "Машина", "sell", (100, 1), "next", sort="price", price_min=10, price_max=1000, columns=ID),
+        ("get_ads_page(price, prev, all)",) + ads_page_query("TEXAS", "Машина", None, (100, 1), "prev", sort="price", columns=ID),
+        ("iter_ads", with_children_query(SQL_ADS_AFTER), (0, 1000)),
+        ("iter_users", SQL_USERS_AFTER, (0, 5000)),
+        ("import_ads(replace)", SQL_DELETE_AD, (1,)),
+        ("import_users", SQL_IMPORT_USER, (1, "u", 0)),
+        ("import_progress", SQL_GET_IMPORT_PROGRESS, ("ads:/tmp/ads.jsonl",)),
+        ("import_progress(set)", SQL_SET_IMPORT_PROGRESS, ("ads:/tmp/ads.jsonl", 1, 1)),
+        ("find_matches(sell)",) + matches_query("TEXAS", "Машина", "sell", 100, 1),
+        ("find_matches(buy)",) + matches_query("TEXAS", "Машина", "buy", 100, 1),
+        ("search_ads",) + search_ads_query('"infernus"*', "TEXAS", "Машина"),
+    ]
+
+def explain(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+def check_query_plans(conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """Вернуть список запросов, план которых содержит полный SCAN таблицы или TEMP B-TREE.
+
+    SCAN виртуальной таблицы FTS5 — это поиск по её собственному индексу, а не полный проход;
+    SCAN материализованного CTE или подзапроса (with_children_query, поля архива) — проход по уже выбранным строкам.
+    """
+    conn = conn or get_conn()
+    problems = []
+    for name, sql, params in query_plan_cases():
+        materialized = set()
+        for detail in explain(conn, sql, params):
+            if detail.startswith(("MATERIALIZE ", "CO-ROUTINE ")):
+                materialized.add(detail.split()[1])
+            elif detail.startswith("SCAN") and detail.split()[1] in materialized:
+                continue
+            elif (detail.startswith("SCAN") and "VIRTUAL TABLE" not in detail) or "TEMP B-TREE" in detail:
+                problems.append(f"{name}: {detail}")
+    return problems
@@ -0,0 +1,83 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+Обновления разных чатов обрабатываются одновременно (не больше limit штук),
+обновления одного чата — строго в порядке поступления, поэтому состояния
+ConversationHandler (STATE_FILL_FIELDS, STATE_ATTACH_PHOTOS, ...) не гоняются.
+"""
+import asyncio
+from typing import Any, Awaitable, Dict, Hashable, List, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Семафор базового класса не должен ограничивать: иначе обновления одного чата, ждущие своей
+# очереди, занимали бы слоты других пользователей. Лимит применяется уже после очереди чата.
+# Поэтому max_concurrent_updates не переопределяется (по нему базовый класс создаёт семафор);
+# настоящий лимит — self.limit, он и показывается в stats().
+_UNBOUNDED = 2 ** 31 - 1
+
+def update_key(update: object) -> Optional[Hashable]:
+    """Ключ очереди: чат обновления, иначе пользователь; None — порядок не важен."""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ("user", update.effective_user.id)
+    return None
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        super().__init__(max_concurrent_updates=_UNBOUNDED)
+        self._workers: Optional[asyncio.Semaphore] = None
+        # ключ -> [lock, число обновлений этого чата в работе или в очереди]
+        self._chats: Dict[Hashable, List[Any]] = {}
+        self.processed = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def initialize(self) -> None:
+        self._workers = asyncio.Semaphore(self.limit)
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        if self._workers is None:
+            await self.initialize()
+        key = update_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+        # очередь занимаем синхронно, до первого await, — так сохраняется порядок поступления
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[key]
+
+    async def _run(self, coroutine: "Awaitable[Any]") -> None:
+        async with self._workers:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            try:
+                await coroutine
+            finally:
+                self.active -= 1
+                self.processed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "max_active": self.max_active,
+            "chats_queued": len(self._chats),
+            "pending": sum(e[1] for e in self._chats.values()),
+            "processed": self.processed,
+        }
@@ -0,0 +1,57 @@
+"""
+Сроки объявлений: фоновая задача JobQueue снимает истёкшие закрепы и переносит
+объявления с истёкшим expires_at в архив (ads_archive).
+
+Работа идёт пачками по EXPIRY_BATCH строк — каждая пачка в своей короткой
+транзакции, чтобы не держать блокировку записи и не задерживать публикацию.
+"""
+import logging
+import time
+from typing import Dict, Optional
+from telegram.ext import ContextTypes
+from . import repo
+from .config import EXPIRY_BATCH
+
+logger = logging.getLogger(__name__)
+
+# Не больше стольких пачек за один запуск; остальное — в следующий
+MAX_BATCHES_PER_RUN = 20
+
+_runs = 0
+_unpinned = 0
+_archived = 0
+_last_run_ms = 0.0
+
+async def _drain(step, now: int, batch: int) -> int:
+    total = 0
+    for _ in range(MAX_BATCHES_PER_RUN):
+        ids = await step(now, batch)
+        total += len(ids)
+        if len(ids) < batch:
+            break
+    return total
+
+async def expire_once(now: Optional[int] = None, batch: int = EXPIRY_BATCH):
+    """Один проход: сначала закрепы, затем объявления. Возвращает (снято закрепов, перенесено в архив)."""
+    now = int(time.time()) if now is None else now
+    unpinned = await _drain(repo.unpin_expired, now, batch)
+    archived = await _drain(repo.archive_expired, now, batch)
+    return unpinned, archived
+
+async def expiry_job(context: ContextTypes.DEFAULT_TYPE):
+    global _runs, _unpinned, _archived, _last_run_ms
+    start = time.perf_counter()
+    try:
+        unpinned, archived = await expire_once()
+    except Exception as e:
+        logger.warning("Не удалось обработать истёкшие объявления: %s", e)
+        return
+    _runs += 1
+    _unpinned += unpinned
+    _archived += archived
+    _last_run_ms = (time.perf_counter() - start) * 1000
+    if unpinned or archived:
+        logger.info("Снято закрепов: %s, в архив: %s", unpinned, archived)
+
+def stats() -> Dict:
+    return {"runs": _runs, "unpinned": _unpinned, "archived": _archived, "last_run_ms": round(_last_run_ms, 3)}
@@ -0,0 +1,70 @@
+"""
+Реестр статических inline-клавиатур.
+
+Все клавиатуры меню строятся один раз при старте и переиспользуются. Объекты
+InlineKeyboardMarkup в PTB 20 неизменяемые, поэтому их можно отдавать всем
+пользователям; StaticKeyboard дополнительно хранит готовый словарь to_dict(),
+чтобы при каждой отправке не пересобирать дерево кнопок.
+"""
+from typing import Any, Dict, List, Sequence
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+SUPPORT_URL = "https://t.me/azdanm"
+
+class StaticKeyboard(InlineKeyboardMarkup):
+    __slots__ = ("_dict",)
+
+    def __init__(self, inline_keyboard: Sequence[Sequence[InlineKeyboardButton]]):
+        super().__init__(inline_keyboard)
+        # объект уже заморожен PTB; object.__setattr__ обходит проверку, не трогая приватное API PTB
+        object.__setattr__(self, "_dict", super().to_dict())
+
+    def to_dict(self, recursive: bool = True) -> Dict[str, Any]:
+        # словарь общий для всех отправок; PTB только сериализует его и не изменяет
+        return self._dict if recursive else super().to_dict(recursive=False)
+
+def _back_row() -> List[InlineKeyboardButton]:
+    return [InlineKeyboardButton("Назад", callback_data="menu:back")]
+
+def _picker(items: Sequence[str], prefix: str) -> StaticKeyboard:
+    kb = [[InlineKeyboardButton(item, callback_data=f"{prefix}:{item}")] for item in items]
+    kb.append(_back_row())
+    return StaticKeyboard(kb)
+
+class KeyboardRegistry:
+    """Все статические клавиатуры бота, собранные один раз."""
+
+    def __init__(self, servers: Sequence[str], categories: Sequence[str], types: Sequence[str]):
+        self.main = StaticKeyboard([
+            [InlineKeyboardButton("Продать", callback_data="action:sell"), InlineKeyboardButton("Купить", callback_data="action:buy")],
+            [InlineKeyboardButton("Поиск", callback_data="action:search"), InlineKeyboardButton("Профиль", callback_data="action:profile")],
+            [InlineKeyboardButton("VIP / Подписка", callback_data="action:vip"), InlineKeyboardButton("Услуги", callback_data="action:services")],
+            [InlineKeyboardButton("Техподдержка", url=SUPPORT_URL)],
+        ])
+        self.back = StaticKeyboard([_back_row()])
+        self.profile = StaticKeyboard([
+            [InlineKeyboardButton("🗄 Архив объявлений", callback_data="action:archive")],
+            _back_row(),
+        ])
+        self.servers = _picker(servers, "server")
+        self.categories = _picker(categories, "category")
+        self.types = _picker(types, "type")
+        self.search_servers = _picker(servers, "search_server")
+        self.search_categories = _picker(categories, "search_category")
+        self.search_actions: Dict[str, StaticKeyboard] = {
+            c: StaticKeyboard([
+                [InlineKeyboardButton("Все", callback_data=f"search_do:all:{c}")],
+                [InlineKeyboardButton("Продать", callback_data=f"search_do:sell:{c}"), InlineKeyboardButton("Купить", callback_data=f"search_do:buy:{c}")],
+                [InlineKeyboardButton("💰 Продажа: дешевле", callback_data=f"search_cheap:sell:{c}"), InlineKeyboardButton("💰 Покупка: дешевле", callback_data=f"search_cheap:buy:{c}")],
+                [InlineKeyboardButton("🔎 По тексту", callback_data=f"search_text:{c}")],
+                _back_row(),
+            ])
+            for c in categories
+        }
+        self.attach = StaticKeyboard([
+            [InlineKeyboardButton("Прикрепить фото (отправьте фото ниже)", callback_data="attach:photos")],
+            [InlineKeyboardButton("Пропустить", callback_data="attach:skip")],
+        ])
+        self.confirm = StaticKeyboard([
+            [InlineKeyboardButton("Опубликовать", callback_data="confirm:publish"), InlineKeyboardButton("Отмена", callback_data="confirm:cancel")],
+        ])
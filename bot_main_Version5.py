@@ -3,13 +3,16 @@
 - формы продажи/покупки
 - поддержка фото (file_id)
 - поиск с листанием
+- полнотекстовый поиск /find по полям объявлений
 - профиль (активные объявления)
 - команда /del — удаляет только свои объявления
 - команда /deleted — "секретная", удаляет любое объявление по номеру
-- секретные команды /vipp, /zakrepp, /unzakrep — доступны любому, кто их знает
+- секретные команды /vipp, /zakrepp, /unzakrep, /stats — доступны любому, кто их знает
 """
+import asyncio
 import logging
-import json
+import signal
+import time
 from typing import Dict, List, Optional
 from telegram import (
     Update,
@@ -17,17 +20,42 @@ from telegram import (
     InlineKeyboardMarkup,
     InputMediaPhoto,
 )
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import (
     ApplicationBuilder,
+    ChatMemberHandler,
     CommandHandler,
+    TypeHandler,
     MessageHandler,
     ContextTypes,
     CallbackQueryHandler,
     ConversationHandler,
     filters,
 )
-from .config import BOT_TOKEN, ADMIN_ID, CHANNEL_USERNAME, LOG_LEVEL
-from .db import init_db, ensure_user, add_ad, get_ad, get_ads, delete_ad, get_user_ads, set_vip, get_user, set_pin
+from .config import (
+    BOT_TOKEN, ADMIN_ID, CHANNEL_USERNAME, LOG_LEVEL, BOT_MODE, UPDATE_CONCURRENCY, BOT_API_URL,
+    RATE_LIMIT_ENABLED, RATE_GLOBAL_PER_SEC, RATE_CHAT_PER_SEC, RATE_CHAT_BURST, RATE_GROUP_PER_MIN, RATE_MAX_RETRIES,
+    BOT_CONNECTION_POOL_SIZE, SEARCH_EDIT_IN_PLACE, SUB_CACHE_TTL_POSITIVE, SUB_CACHE_TTL_NEGATIVE, SUB_CACHE_SIZE,
+    USER_FLUSH_INTERVAL, MATCH_ENABLED, SAVED_SEARCHES_PER_USER, PIN_HOURS, EXPIRY_INTERVAL,
+    PERSISTENCE_ENABLED, PERSIST_INTERVAL, PERSIST_BATCH, CONVERSATION_TIMEOUT, STATE_SWEEP_INTERVAL,
+)
+from .db import init_db, close_db, pool_stats, ad_cursor
+from . import repo
+from .cache import ad_cards, AdCard
+from .keyboards import KeyboardRegistry, SUPPORT_URL
+from .webhook import start_webhook, stop_webhook
+from .dispatch import PerChatUpdateProcessor
+from .ratelimit import TokenBucketRateLimiter
+from .membership import MembershipCache
+from .users import user_writes
+from .prices import parse_price
+from .notify import notifier
+from .matching import match_ad
+from .saved import saved_searches
+from . import expiry
+from .persistence import SQLitePersistence
+from .state import state_sweeper
 
 # logging
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=getattr(logging, LOG_LEVEL, logging.INFO))
@@ -77,46 +105,73 @@ FIELDS_TEMPLATE_BUY = {
     "Костюмы": ["Ваш ник", "Название костюма", "Бюджет", "Контакт (TG/VK)"],
 }
 
+# Шаблоны для категорий без своего шаблона
+FIELDS_DEFAULT = ["Ваш ник", "Название", "Цена", "Контакт (TG/VK)"]
+FIELDS_DEFAULT_BUY = ["Ваш ник", "Описание", "Бюджет/Цена", "Контакт (TG/VK)"]
+
+# Все ключи полей форм — заносятся в справочник field_keys при старте
+FIELD_KEYS = list(dict.fromkeys(
+    key
+    for template in (*FIELDS_TEMPLATE.values(), *FIELDS_TEMPLATE_BUY.values(), FIELDS_DEFAULT, FIELDS_DEFAULT_BUY)
+    for key in template
+))
+
 GREETING_TEXT = (
     "Добро пожаловать, здесь вы можете быстрее и удобнее продать или купить: "
     "машину, аксессуар, недвижимость, аксессуары, бизнесы, сим-карта, номерные знаки авто.\n\n"
     "Перед публикацией вы можете приложить фото товара при соответствующем шаге."
 )
 
+CAPTION_LIMIT = MessageLimit.CAPTION_LENGTH
+FIND_PAGE_SIZE = 10
+
+# Статические клавиатуры собираются один раз при старте
+KEYBOARDS = KeyboardRegistry(SERVERS, CATEGORIES, TYPES_BASE)
+
 def make_main_keyboard():
-    kb = [
-        [InlineKeyboardButton("Продать", callback_data="action:sell"), InlineKeyboardButton("Купить", callback_data="action:buy")],
-        [InlineKeyboardButton("Поиск", callback_data="action:search"), InlineKeyboardButton("Профиль", callback_data="action:profile")],
-        [InlineKeyboardButton("VIP / Подписка", callback_data="action:vip"), InlineKeyboardButton("Услуги", callback_data="action:services")],
-        [InlineKeyboardButton("Техподдержка", url="https://t.me/azdanm")]
-    ]
-    return InlineKeyboardMarkup(kb)
+    return KEYBOARDS.main
+
+# Ключи user_data, которые относятся к форме объявления
+FORM_KEYS = ("action", "server", "category", "type", "fields_keys", "fields_values", "current_field_idx", "photos")
+
+# Кэш подписок на канал (обновляется и по chat_member, если бот — админ канала)
+subscriptions = MembershipCache(CHANNEL_USERNAME, SUB_CACHE_TTL_POSITIVE, SUB_CACHE_TTL_NEGATIVE, SUB_CACHE_SIZE)
 
 async def check_subscription_required(app, user_id):
     if not CHANNEL_USERNAME:
         return True
     try:
-        member = await app.bot.get_chat_member(CHANNEL_USERNAME, user_id)
-        status = member.status
-        return status not in ("left", "kicked")
+        return await subscriptions.is_member(app.bot, user_id)
     except Exception as e:
         logger.warning("Не удалось проверить подписку: %s", e)
         return True
 
 def format_ad_message(ad: Dict) -> str:
-    fields = json.loads(ad["fields"] or "{}")
     lines = [f"#{ad['id']} • {ad['server']} • {ad['category']} • {'VIP' if ad['vip'] else ''}{' 📌' if ad['pinned'] else ''}"]
     lines.append(f"Действие: {'Продать' if ad['action']=='sell' else 'Купить'}")
     lines.append(f"Тип: {ad['type']}")
-    for k, v in fields.items():
+    for k, v in ad["fields"].items():
         lines.append(f"{k}: {v}")
     lines.append(f"Автор: {ad.get('username') or ad.get('user_id')}")
     return "\n".join(lines)
 
+def get_ad_card(ad: Dict) -> AdCard:
+    """Отрисованная карточка объявления из кэша (или отрисовать и положить в кэш)."""
+    card = ad_cards.get(ad["id"])
+    if card is None:
+        text = format_ad_message(ad)
+        photos = tuple(ad["photos"])[:10]
+        # если текст помещается в подпись, карточка показывается одним сообщением-фото
+        caption = text if len(text) <= CAPTION_LIMIT else None
+        media = tuple(InputMediaPhoto(pid, caption=caption) for pid in photos)
+        card = AdCard(text, photos, media, ad["user_id"], ad_cursor(ad), ad.get("price"))
+        ad_cards.set(ad["id"], card)
+    return card
+
 # Handlers
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    ensure_user(user.id, user.username)
+    await user_writes.ensure_user(user.id, user.username)
     keyboard = make_main_keyboard()
     await update.message.reply_text(GREETING_TEXT, reply_markup=keyboard)
 
@@ -126,23 +181,33 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
     if data == "action:sell" or data == "action:buy":
         context.user_data["action"] = "sell" if data.endswith("sell") else "buy"
-        kb = [[InlineKeyboardButton(s, callback_data=f"server:{s}")] for s in SERVERS]
-        kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
-        await query.message.reply_text("Выберите сервер:", reply_markup=InlineKeyboardMarkup(kb))
+        await query.message.reply_text("Выберите сервер:", reply_markup=KEYBOARDS.servers)
         return STATE_SELECT_SERVER
     elif data == "action:search":
-        kb = [[InlineKeyboardButton(s, callback_data=f"search_server:{s}")] for s in SERVERS]
-        kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
-        await query.message.reply_text("Выберите сервер для поиска:", reply_markup=InlineKeyboardMarkup(kb))
+        await query.message.reply_text("Выберите сервер для поиска:", reply_markup=KEYBOARDS.search_servers)
         return ConversationHandler.END
     elif data == "action:profile":
         user_id = query.from_user.id
-        ads = get_user_ads(user_id)
+        ads = await repo.get_user_ads(user_id)
+        if not ads:
+            await query.message.reply_text("У вас нет активных объявлений.", reply_markup=KEYBOARDS.profile)
+        else:
+            text = "Ваши объявления:\n" + "\n\n".join([f"#{a.id} • {a.server} • {a.category} • {a.type} • {'Продать' if a.action=='sell' else 'Купить'}" for a in ads])
+            await query.message.reply_text(text, reply_markup=KEYBOARDS.profile)
+        return ConversationHandler.END
+    elif data == "action:archive":
+        # архив — отдельная таблица (или файл), горячую таблицу объявлений этот запрос не трогает
+        ads = await repo.get_user_archive(query.from_user.id)
         if not ads:
-            await query.message.reply_text("У вас нет активных объявлений.", reply_markup=make_main_keyboard())
+            await query.message.reply_text("Архив пуст.", reply_markup=KEYBOARDS.back)
         else:
-            text = "Ваши объявления:\n" + "\n\n".join([f"#{a['id']} • {a['server']} • {a['category']} • {a['type']} • {'Продать' if a['action']=='sell' else 'Купить'}" for a in ads])
-            await query.message.reply_text(text, reply_markup=make_main_keyboard())
+            reasons = {"deleted": "удалено", "expired": "истёк срок"}
+            text = "Архив ваших объявлений (последние):\n" + "\n\n".join([
+                f"#{a['id']} • {a['server']} • {a['category']} • {a['type']} • {'Продать' if a['action']=='sell' else 'Купить'}\n"
+                f"{reasons.get(a['reason'], a['reason'])} {time.strftime('%d.%m.%Y', time.localtime(a['archived_at']))}"
+                for a in ads
+            ])
+            await query.message.reply_text(text, reply_markup=KEYBOARDS.back)
         return ConversationHandler.END
     elif data == "action:vip":
         text = (
@@ -158,8 +223,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "2. Услуга вечный VIP — при покупке все ваши опубликованные объявления будут видны всем пользователям бота. Стоимость: 50₽\n\n"
             "Чтобы приобрести услуги, напишите в личные сообщения: @azdanm"
         )
-        kb = [[InlineKeyboardButton("Назад", callback_data="menu:back")]]
-        await query.message.reply_text(text, reply_markup=InlineKeyboardMarkup(kb))
+        await query.message.reply_text(text, reply_markup=KEYBOARDS.back)
         return ConversationHandler.END
     elif data == "menu:back":
         await query.message.edit_text(GREETING_TEXT, reply_markup=make_main_keyboard())
@@ -170,9 +234,7 @@ async def select_server_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     server = query.data.split(":", 1)[1]
     context.user_data["server"] = server
-    kb = [[InlineKeyboardButton(c, callback_data=f"category:{c}")] for c in CATEGORIES]
-    kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
-    await query.message.reply_text(f"Сервер: {server}\nВыберите категорию:", reply_markup=InlineKeyboardMarkup(kb))
+    await query.message.reply_text(f"Сервер: {server}\nВыберите категорию:", reply_markup=KEYBOARDS.categories)
     return STATE_SELECT_CATEGORY
 
 async def select_category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -180,9 +242,7 @@ async def select_category_callback(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     category = query.data.split(":", 1)[1]
     context.user_data["category"] = category
-    kb = [[InlineKeyboardButton(t, callback_data=f"type:{t}")] for t in TYPES_BASE]
-    kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
-    await query.message.reply_text(f"Категория: {category}\nВыберите тип объявления (Ивент / BattlePass / Обычный):", reply_markup=InlineKeyboardMarkup(kb))
+    await query.message.reply_text(f"Категория: {category}\nВыберите тип объявления (Ивент / BattlePass / Обычный):", reply_markup=KEYBOARDS.types)
     return STATE_SELECT_TYPE
 
 async def select_type_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -193,9 +253,9 @@ async def select_type_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     action = context.user_data.get("action", "sell")
     category = context.user_data.get("category")
     if action == "buy":
-        template = FIELDS_TEMPLATE_BUY.get(category, ["Ваш ник", "Описание", "Бюджет/Цена", "Контакт (TG/VK)"])
+        template = FIELDS_TEMPLATE_BUY.get(category, FIELDS_DEFAULT_BUY)
     else:
-        template = FIELDS_TEMPLATE.get(category, ["Ваш ник", "Название", "Цена", "Контакт (TG/VK)"])
+        template = FIELDS_TEMPLATE.get(category, FIELDS_DEFAULT)
     context.user_data["fields_keys"] = template
     context.user_data["fields_values"] = {}
     context.user_data["current_field_idx"] = 0
@@ -203,7 +263,22 @@ async def select_type_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.message.reply_text(f"Введите: {key}\n\n(Вы можете отправить любое текстовое описание; также можно приложить фотографию товара позже)")
     return STATE_FILL_FIELDS
 
+async def form_expired(message, context: ContextTypes.DEFAULT_TYPE):
+    # данные формы очищены (таймаут или очистка неактивных), а диалог ещё в середине — начинаем заново
+    for key in FORM_KEYS:
+        context.user_data.pop(key, None)
+    await message.reply_text("Заполнение объявления устарело, начните заново.", reply_markup=make_main_keyboard())
+    return ConversationHandler.END
+
+async def form_timeout_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # ConversationHandler.TIMEOUT: форма брошена — освобождаем её данные
+    for key in FORM_KEYS:
+        context.user_data.pop(key, None)
+    state_sweeper.timeouts += 1
+
 async def fill_fields_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if "fields_keys" not in context.user_data:
+        return await form_expired(update.message, context)
     text = update.message.text if update.message and update.message.text else None
     if not text:
         await update.message.reply_text("Пожалуйста, введите текст для данного поля.")
@@ -222,11 +297,7 @@ async def fill_fields_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text(f"Введите: {next_key}")
         return STATE_FILL_FIELDS
     else:
-        kb = [
-            [InlineKeyboardButton("Прикрепить фото (отправьте фото ниже)", callback_data="attach:photos")],
-            [InlineKeyboardButton("Пропустить", callback_data="attach:skip")],
-        ]
-        await update.message.reply_text("Все поля заполнены. Теперь вы можете приложить фото товара (до 5) или пропустить.", reply_markup=InlineKeyboardMarkup(kb))
+        await update.message.reply_text("Все поля заполнены. Теперь вы можете приложить фото товара (до 5) или пропустить.", reply_markup=KEYBOARDS.attach)
         context.user_data["photos"] = []
         return STATE_ATTACH_PHOTOS
 
@@ -280,8 +351,7 @@ async def confirm_ad_prompt(message, context):
         lines.append(f"{k}: {v}")
     lines.append("Вы можете приложить фото (если уже добавлены — будут отображены).")
     text = "\n".join(lines)
-    kb = [[InlineKeyboardButton("Опубликовать", callback_data="confirm:publish"), InlineKeyboardButton("Отмена", callback_data="confirm:cancel")]]
-    await message.reply_text(text, reply_markup=InlineKeyboardMarkup(kb))
+    await message.reply_text(text, reply_markup=KEYBOARDS.confirm)
     if photos:
         try:
             media = [InputMediaPhoto(pid) for pid in photos[:10]]
@@ -299,6 +369,8 @@ async def confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data.clear()
         return ConversationHandler.END
     elif data == "confirm:publish":
+        if not context.user_data.get("category"):
+            return await form_expired(query.message, context)
         user = query.from_user
         allowed = await check_subscription_required(context.application, user.id)
         if not allowed:
@@ -311,94 +383,354 @@ async def confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         type_ = context.user_data.get("type")
         fields = context.user_data.get("fields_values", {})
         photos = context.user_data.get("photos", [])
-        u = get_user(user.id)
-        vip_user = bool(u and u.get("vip"))
-        ad_id = add_ad(user.id, user.username or "", server, category, type_, action, fields, photos, vip=vip_user)
+        u = await repo.get_user(user.id, ("vip",))
+        vip_user = bool(u and u.vip)
+        ad_id = await repo.add_ad(user.id, user.username or "", server, category, type_, action, fields, photos, vip=vip_user)
         await query.message.reply_text(f"Ваше объявление опубликовано. Номер объявления #{ad_id}", reply_markup=make_main_keyboard())
+        # подбор встречных объявлений и рассылка подписчикам — в фоне, ответ пользователю их не ждёт
+        context.application.create_task(after_publish(ad_id))
         context.user_data.clear()
         return ConversationHandler.END
 
+async def after_publish(ad_id: int):
+    try:
+        ad = await repo.get_ad(ad_id)
+        if ad is None:
+            return
+        if MATCH_ENABLED:
+            await match_ad(ad)
+        await saved_searches.fan_out(ad, "🔔 Новое объявление по вашей подписке:\n\n" + get_ad_card(ad).text)
+    except Exception:
+        logger.exception("Ошибка обработки нового объявления #%s", ad_id)
+
 async def search_server_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     server = query.data.split(":", 1)[1]
     context.user_data["search_server"] = server
-    kb = [[InlineKeyboardButton(c, callback_data=f"search_category:{c}")] for c in CATEGORIES]
-    kb.append([InlineKeyboardButton("Назад", callback_data="menu:back")])
-    await query.message.reply_text(f"Поиск — сервер: {server}\nВыберите категорию:", reply_markup=InlineKeyboardMarkup(kb))
+    await query.message.reply_text(f"Поиск — сервер: {server}\nВыберите категорию:", reply_markup=KEYBOARDS.search_categories)
 
 async def search_category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     category = query.data.split(":", 1)[1]
     server = context.user_data.get("search_server")
-    kb = [
-        [InlineKeyboardButton("Все", callback_data=f"search_do:all:{category}")],
-        [InlineKeyboardButton("Продать", callback_data=f"search_do:sell:{category}"), InlineKeyboardButton("Купить", callback_data=f"search_do:buy:{category}")],
-        [InlineKeyboardButton("Назад", callback_data="menu:back")],
-    ]
-    await query.message.reply_text(f"Сервер: {server}\nКатегория: {category}\nВыберите действие для поиска:", reply_markup=InlineKeyboardMarkup(kb))
+    kb = KEYBOARDS.search_actions.get(category)
+    if kb is None:
+        await query.message.reply_text("Неизвестная категория.", reply_markup=make_main_keyboard())
+        return
+    await query.message.reply_text(f"Сервер: {server}\nКатегория: {category}\nВыберите действие для поиска:", reply_markup=kb)
 
 async def search_do_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # search_do:<действие>:<категория> — новые сначала, search_cheap:... — дешёвые сначала
     query = update.callback_query
     await query.answer()
-    _, action_filter, category = query.data.split(":", 2)
+    mode, action_filter, category = query.data.split(":", 2)
     server = context.user_data.get("search_server")
     action = None if action_filter == "all" else action_filter
-    ads = get_ads(server=server, category=category, action=action)
-    if not ads:
+    sort = "price" if mode == "search_cheap" else "date"
+    price_min, price_max = context.user_data.get("price_range") or (None, None)
+    ad_id, has_next = await repo.get_ads_page(server=server, category=category, action=action, sort=sort, price_min=price_min, price_max=price_max)
+    # объявление читается из БД только при промахе кэша карточек; удалённое между запросами — как пустая выдача
+    card = await _load_card(ad_id) if ad_id is not None else None
+    if card is None:
         await query.message.reply_text("Объявлений не найдено.", reply_markup=make_main_keyboard())
         return
-    context.user_data["search_results"] = [a["id"] for a in ads]
-    context.user_data["search_idx"] = 0
-    await show_search_result(query.message, context)
+    # в состоянии храним только фильтр; позиция в выдаче передаётся курсором в callback_data
+    context.user_data["search_filter"] = [server, category, action, sort, price_min, price_max]
+    await show_search_result(query.message, card, has_prev=False, has_next=has_next, sort=sort)
 
-async def show_search_result(message, context: ContextTypes.DEFAULT_TYPE):
-    idx = context.user_data.get("search_idx", 0)
-    results = context.user_data.get("search_results", [])
-    if not results:
-        await message.reply_text("Нет результатов.")
+def _format_price(value: Optional[int]) -> str:
+    return f"{value:,}".replace(",", " ") if value is not None else "—"
+
+async def price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /price <от> [до] — диапазон цены для поиска (например /price 500к 1.5kk); /price без аргументов — сбросить
+    args = context.args
+    if not args:
+        context.user_data.pop("price_range", None)
+        await update.message.reply_text("Фильтр по цене сброшен.")
         return
-    ad_id = results[idx]
-    ad = get_ad(ad_id)
-    if not ad:
-        await message.reply_text("Ошибка: объявление не найдено.")
+    price_min = parse_price(args[0])
+    price_max = parse_price(" ".join(args[1:])) if len(args) > 1 else None
+    if price_min is None or (price_max is not None and price_max < price_min):
+        await update.message.reply_text("Использование: /price <от> [до], например /price 500к 1.5kk")
         return
-    text = format_ad_message(ad)
+    context.user_data["price_range"] = [price_min, price_max]
+    await update.message.reply_text(f"Фильтр по цене для поиска: от {_format_price(price_min)} до {_format_price(price_max)}.")
+
+def _search_keyboard(card: AdCard, photo_idx: int, has_prev: bool, has_next: bool, sort: str = "date") -> InlineKeyboardMarkup:
+    ad_id = card.cursor[-1]
+    if sort == "price":
+        nav_data = f"search_pnav:{{}}:{card.price}:{ad_id}"
+    else:
+        pinned, created_at, _ = card.cursor
+        nav_data = f"search_nav:{{}}:{pinned}:{created_at}:{ad_id}"
+    rows = []
+    if len(card.photos) > 1 and card.media[0].caption is not None:
+        next_idx = (photo_idx + 1) % len(card.photos)
+        flags = f"{int(has_prev)}{int(has_next)}{'p' if sort == 'price' else ''}"
+        rows.append([InlineKeyboardButton(f"📷 {photo_idx + 1}/{len(card.photos)} ▶️", callback_data=f"search_ph:{ad_id}:{next_idx}:{flags}")])
+    elif card.photos and card.media[0].caption is None:
+        # длинный текст не помещается в подпись — фото по запросу отдельным альбомом
+        rows.append([InlineKeyboardButton(f"📷 Фото ({len(card.photos)})", callback_data=f"search_media:{ad_id}")])
     nav_row = []
-    if idx > 0:
-        nav_row.append(InlineKeyboardButton("◀️ Назад", callback_data="search_nav:prev"))
-    if idx < len(results) - 1:
-        nav_row.append(InlineKeyboardButton("Вперёд ▶️", callback_data="search_nav:next"))
-    kb2 = [
-        InlineKeyboardButton("Пожаловаться/Техподдержка", url="https://t.me/azdanm"),
+    if has_prev:
+        nav_row.append(InlineKeyboardButton("◀️ Назад", callback_data=nav_data.format("prev")))
+    if has_next:
+        nav_row.append(InlineKeyboardButton("Вперёд ▶️", callback_data=nav_data.format("next")))
+    if nav_row:
+        rows.append(nav_row)
+    rows.append([
+        InlineKeyboardButton("Пожаловаться/Техподдержка", url=SUPPORT_URL),
         InlineKeyboardButton("Назад в меню", callback_data="menu:back"),
-    ]
-    rows = [nav_row] if nav_row else []
-    rows.append(kb2)
-    await message.reply_text(text, reply_markup=InlineKeyboardMarkup(rows))
-    photos = json.loads(ad.get("photos") or "[]")
-    if photos:
+    ])
+    return InlineKeyboardMarkup(rows)
+
+async def show_search_result(message, card: AdCard, has_prev: bool, has_next: bool, photo_idx: int = 0, edit: bool = False, sort: str = "date"):
+    """Показать карточку одним сообщением; при edit=True — отредактировать message на месте."""
+    markup = _search_keyboard(card, photo_idx, has_prev, has_next, sort)
+    as_photo = bool(card.photos) and card.media[0].caption is not None
+    if edit:
         try:
-            media = [InputMediaPhoto(pid) for pid in photos[:10]]
-            await message.reply_media_group(media)
-        except Exception:
+            if as_photo and message.photo:
+                await message.edit_media(card.media[photo_idx], reply_markup=markup)
+                return
+            if not as_photo and not message.photo:
+                await message.edit_text(card.text, reply_markup=markup)
+                return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            raise
+        # текстовое сообщение нельзя превратить в фото (и наоборот) — заменяем сообщение
+        try:
+            await message.delete()
+        except TelegramError:
             pass
+    if as_photo:
+        await message.reply_photo(card.photos[photo_idx], caption=card.text, reply_markup=markup)
+    else:
+        await message.reply_text(card.text, reply_markup=markup)
 
 async def search_nav_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # search_nav:<dir>:<pinned>:<created_at>:<id> или search_pnav:<dir>:<price>:<id> (сортировка по цене)
     query = update.callback_query
+    parts = query.data.split(":")
+    sort = "price" if parts[0] == "search_pnav" else "date"
+    search_filter = context.user_data.get("search_filter")
+    try:
+        direction = parts[1]
+        cursor = tuple(int(x) for x in parts[2:])
+    except (IndexError, ValueError):
+        cursor = None
+    if cursor is None or len(cursor) != (2 if sort == "price" else 3) or not search_filter or len(search_filter) < 6 or search_filter[3] != sort:
+        await query.answer("Поиск устарел, начните заново.", show_alert=True)
+        return
+    server, category, action, _, price_min, price_max = search_filter
+    ad_id, more = await repo.get_ads_page(server=server, category=category, action=action, cursor=cursor, direction=direction,
+                                          sort=sort, price_min=price_min, price_max=price_max)
+    card = await _load_card(ad_id) if ad_id is not None else None
+    if card is None:
+        await query.answer("Дальше нет объявлений.")
+        return
     await query.answer()
-    direction = query.data.split(":", 1)[1]
-    idx = context.user_data.get("search_idx", 0)
-    results = context.user_data.get("search_results", [])
-    if direction == "next" and idx < len(results) - 1:
-        context.user_data["search_idx"] = idx + 1
-        await show_search_result(query.message, context)
-    elif direction == "prev" and idx > 0:
-        context.user_data["search_idx"] = idx - 1
-        await show_search_result(query.message, context)
+    if direction == "next":
+        await show_search_result(query.message, card, has_prev=True, has_next=more, edit=SEARCH_EDIT_IN_PLACE, sort=sort)
     else:
-        await query.message.reply_text("Дальше нет объявлений.")
+        await show_search_result(query.message, card, has_prev=more, has_next=True, edit=SEARCH_EDIT_IN_PLACE, sort=sort)
+
+async def _load_card(ad_id: int) -> Optional[AdCard]:
+    card = ad_cards.get(ad_id)
+    if card is None:
+        ad = await repo.get_ad(ad_id)
+        card = get_ad_card(ad) if ad else None
+    return card
+
+async def search_photo_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # листание фото внутри сообщения с карточкой: search_ph:<ad_id>:<номер фото>:<есть назад><есть вперёд>[p — сортировка по цене]
+    query = update.callback_query
+    try:
+        _, ad_id, photo_idx, flags = query.data.split(":")
+        ad_id, photo_idx = int(ad_id), int(photo_idx)
+    except ValueError:
+        await query.answer()
+        return
+    card = await _load_card(ad_id)
+    if card is None:
+        await query.answer("Объявление удалено.", show_alert=True)
+        return
+    await query.answer()
+    photo_idx = photo_idx % len(card.photos) if card.photos else 0
+    sort = "price" if flags[2:3] == "p" else "date"
+    await show_search_result(query.message, card, has_prev=flags[:1] == "1", has_next=flags[1:2] == "1", photo_idx=photo_idx, edit=True, sort=sort)
+
+async def search_media_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # фото объявления альбомом (для карточек, текст которых не помещается в подпись)
+    query = update.callback_query
+    try:
+        ad_id = int(query.data.split(":", 1)[1])
+    except ValueError:
+        await query.answer()
+        return
+    card = await _load_card(ad_id)
+    await query.answer()
+    if card and card.media:
+        await query.message.reply_media_group(list(card.media))
+
+def _parse_find_args(args: List[str]):
+    """/find [сервер] [категория] <текст> -> (server, category, text)."""
+    server = category = None
+    if args and args[0].upper() in SERVERS:
+        server = args[0].upper()
+        args = args[1:]
+    rest = " ".join(args)
+    for c in sorted(CATEGORIES, key=len, reverse=True):
+        if rest.lower().startswith(c.lower()) and (len(rest) == len(c) or rest[len(c)] == " "):
+            category = c
+            rest = rest[len(c):]
+            break
+    return server, category, rest.strip()
+
+def _back_row_menu() -> List[InlineKeyboardButton]:
+    return [InlineKeyboardButton("Назад в меню", callback_data="menu:back")]
+
+def _find_keyboard(results: List[Dict], offset: int, more: bool) -> InlineKeyboardMarkup:
+    ids = [InlineKeyboardButton(f"#{r['id']}", callback_data=f"find_open:{r['id']}") for r in results]
+    rows = [ids[i:i + 5] for i in range(0, len(ids), 5)]
+    nav_row = []
+    if offset > 0:
+        nav_row.append(InlineKeyboardButton("◀️ Назад", callback_data=f"find_nav:{max(0, offset - FIND_PAGE_SIZE)}"))
+    if more:
+        nav_row.append(InlineKeyboardButton("Вперёд ▶️", callback_data=f"find_nav:{offset + FIND_PAGE_SIZE}"))
+    if nav_row:
+        rows.append(nav_row)
+    rows.append(_back_row_menu())
+    return InlineKeyboardMarkup(rows)
+
+async def show_find_results(message, context: ContextTypes.DEFAULT_TYPE, offset: int = 0, edit: bool = False):
+    """Страница результатов полнотекстового поиска (по релевантности) одним сообщением."""
+    text, server, category = context.user_data["find"]
+    results, more = await repo.search_ads(text, server=server, category=category, limit=FIND_PAGE_SIZE, offset=offset)
+    if not results:
+        if edit:
+            await message.edit_text("Больше ничего не найдено.", reply_markup=InlineKeyboardMarkup([_back_row_menu()]))
+        else:
+            await message.reply_text("Ничего не найдено.", reply_markup=make_main_keyboard())
+        return
+    lines = [f"Поиск: {text}" + (f" • {server}" if server else "") + (f" • {category}" if category else "")]
+    for r in results:
+        lines.append(f"\n#{r['id']} • {r['server']} • {r['category']} • {'Продать' if r['action']=='sell' else 'Купить'}{' 📌' if r['pinned'] else ''}")
+        lines.append(r["snippet"])
+    body = "\n".join(lines)
+    markup = _find_keyboard(results, offset, more)
+    if edit:
+        try:
+            await message.edit_text(body, reply_markup=markup)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+    else:
+        await message.reply_text(body, reply_markup=markup)
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /find [сервер] [категория] <текст> — поиск по названию, номеру и другим полям
+    server, category, text = _parse_find_args(context.args)
+    if not text:
+        await update.message.reply_text("Использование: /find [сервер] [категория] <текст>\nНапример: /find TEXAS Машина infernus")
+        return
+    context.user_data["find"] = [text, server, category]
+    await show_find_results(update.message, context)
+
+async def search_text_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # поиск по тексту внутри выбранных в меню сервера и категории: следующий текст пользователя — запрос
+    query = update.callback_query
+    await query.answer()
+    category = query.data.split(":", 1)[1]
+    context.user_data["find_pending"] = [context.user_data.get("search_server"), category]
+    await query.message.reply_text("Введите текст для поиска (название, номер и т.п.):")
+
+async def find_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    pending = context.user_data.pop("find_pending", None)
+    if pending is None:
+        return
+    server, category = pending
+    context.user_data["find"] = [update.message.text.strip(), server, category]
+    await show_find_results(update.message, context)
+
+async def find_nav_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    try:
+        offset = max(0, int(query.data.split(":", 1)[1]))
+    except ValueError:
+        offset = None
+    if offset is None or not context.user_data.get("find"):
+        await query.answer("Поиск устарел, начните заново.", show_alert=True)
+        return
+    await query.answer()
+    await show_find_results(query.message, context, offset, edit=True)
+
+async def find_open_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    try:
+        ad_id = int(query.data.split(":", 1)[1])
+    except ValueError:
+        await query.answer()
+        return
+    card = await _load_card(ad_id)
+    if card is None:
+        await query.answer("Объявление удалено.", show_alert=True)
+        return
+    await query.answer()
+    await show_search_result(query.message, card, has_prev=False, has_next=False)
+
+def _describe_search(s: Dict) -> str:
+    action = {"sell": "продажа", "buy": "покупка"}.get(s["action"], "все")
+    text = f"{s['server']} • {s['category']} • {action}"
+    if s["price_min"] is not None:
+        text += f" • от {_format_price(s['price_min'])}"
+    if s["price_max"] is not None:
+        text += f" • до {_format_price(s['price_max'])}"
+    return text
+
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /subscribe — подписаться на текущий фильтр поиска (сервер, категория, действие, /price)
+    search_filter = context.user_data.get("search_filter")
+    if not search_filter or len(search_filter) < 6:
+        await update.message.reply_text("Сначала выполните поиск (Поиск → сервер → категория → действие), затем отправьте /subscribe.")
+        return
+    server, category, action, _, price_min, price_max = search_filter
+    user_id = update.effective_user.id
+    existing = await repo.get_user_saved_searches(user_id)
+    key = (server, category, action, price_min, price_max)
+    if any((s["server"], s["category"], s["action"], s["price_min"], s["price_max"]) == key for s in existing):
+        await update.message.reply_text("Вы уже подписаны на этот поиск.")
+        return
+    if len(existing) >= SAVED_SEARCHES_PER_USER:
+        await update.message.reply_text(f"Можно сохранить не больше {SAVED_SEARCHES_PER_USER} поисков. Удалите лишние: /subscriptions")
+        return
+    s = await saved_searches.subscribe(user_id, server, category, action, price_min, price_max)
+    await update.message.reply_text(f"Подписка #{s['id']} сохранена: {_describe_search(s)}.\nНовые объявления будут приходить сюда. Отписаться: /unsubscribe {s['id']}")
+
+async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /subscriptions — список сохранённых поисков
+    saved = await repo.get_user_saved_searches(update.effective_user.id)
+    if not saved:
+        await update.message.reply_text("У вас нет сохранённых поисков.")
+        return
+    await update.message.reply_text("Ваши подписки:\n" + "\n".join(f"#{s['id']} • {_describe_search(s)}" for s in saved) + "\n\nОтписаться: /unsubscribe <номер>")
+
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /unsubscribe <номер> — удалить сохранённый поиск
+    args = context.args
+    try:
+        search_id = int(args[0])
+    except (IndexError, ValueError):
+        await update.message.reply_text("Использование: /unsubscribe <номер_подписки>")
+        return
+    if await saved_searches.unsubscribe(update.effective_user.id, search_id):
+        await update.message.reply_text(f"Подписка #{search_id} удалена.")
+    else:
+        await update.message.reply_text("Подписка не найдена.")
 
 # Команда для удаления своих объявлений
 async def del_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -413,14 +745,14 @@ async def del_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("Неверный ID.")
         return
-    ad = get_ad(ad_id)
+    ad = await repo.get_ad(ad_id)
     if not ad:
         await update.message.reply_text("Объявление не найдено.")
         return
     if ad["user_id"] != user.id:
         await update.message.reply_text("Вы можете удалять только свои объявления.")
         return
-    ok = delete_ad(ad_id)
+    ok = await repo.delete_ad(ad_id)
     if ok:
         await update.message.reply_text(f"Ваше объявление #{ad_id} удалено.")
     else:
@@ -438,7 +770,7 @@ async def deleted_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("Неверный ID.")
         return
-    ok = delete_ad(ad_id)
+    ok = await repo.delete_ad(ad_id)
     if ok:
         await update.message.reply_text(f"Объявление #{ad_id} удалено.")
     else:
@@ -455,22 +787,25 @@ async def vipp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("Неверный user_id.")
         return
-    set_vip(target_id, True)
+    await repo.set_vip(target_id, True)
     await update.message.reply_text(f"Пользователю {target_id} выдан VIP.")
 
 async def zakrepp_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    # /zakrepp <ad_id> — закрепить объявление (секретная команда)
+    # /zakrepp <ad_id> [часы] — закрепить объявление на срок, по умолчанию PIN_HOURS (секретная команда)
     args = context.args
     if not args:
-        await update.message.reply_text("Использование: /zakrepp <ad_id>")
+        await update.message.reply_text("Использование: /zakrepp <ad_id> [часы]")
         return
     try:
         ad_id = int(args[0])
+        hours = float(args[1]) if len(args) > 1 else PIN_HOURS
     except ValueError:
-        await update.message.reply_text("Неверный id.")
+        await update.message.reply_text("Неверный id или срок.")
+        return
+    if not await repo.set_pin(ad_id, True, hours):
+        await update.message.reply_text("Объявление не найдено.")
         return
-    set_pin(ad_id, True)
-    await update.message.reply_text(f"Объявление #{ad_id} закреплено.")
+    await update.message.reply_text(f"Объявление #{ad_id} закреплено на {hours:g} ч.")
 
 async def unzakrep_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # /unzakrep <ad_id> — открепить объявление (секретная команда)
@@ -483,9 +818,39 @@ async def unzakrep_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         await update.message.reply_text("Неверный id.")
         return
-    set_pin(ad_id, False)
+    await repo.set_pin(ad_id, False)
     await update.message.reply_text(f"Объявление #{ad_id} откреплено.")
 
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /stats — внутренние метрики бота (секретная команда)
+    lines = ["Пул БД:"]
+    lines += [f"  {k}: {v}" for k, v in pool_stats().items()]
+    lines.append("Операции БД:")
+    lines += [f"  {k}: {v}" for k, v in repo.stats().items()]
+    lines.append("Кэш карточек:")
+    lines += [f"  {k}: {v}" for k, v in ad_cards.stats().items()]
+    lines.append("Обработка обновлений:")
+    lines += [f"  {k}: {v}" for k, v in context.application.update_processor.stats().items()]
+    lines.append("Уведомления:")
+    lines += [f"  {k}: {v}" for k, v in notifier.stats().items()]
+    lines.append("Сохранённые поиски:")
+    lines += [f"  {k}: {v}" for k, v in saved_searches.stats().items()]
+    lines.append("Сроки объявлений:")
+    lines += [f"  {k}: {v}" for k, v in expiry.stats().items()]
+    lines.append("Состояние пользователей:")
+    lines += [f"  {k}: {v}" for k, v in state_sweeper.stats().items()]
+    if context.application.persistence is not None:
+        lines += [f"  persist_{k}: {v}" for k, v in context.application.persistence.stats().items()]
+    lines.append("Запись пользователей:")
+    lines += [f"  {k}: {v}" for k, v in user_writes.stats().items()]
+    if CHANNEL_USERNAME:
+        lines.append("Кэш подписок:")
+        lines += [f"  {k}: {v}" for k, v in subscriptions.stats().items()]
+    if context.bot.rate_limiter is not None:
+        lines.append("Исходящие запросы:")
+        lines += [f"  {k}: {v}" for k, v in context.bot.rate_limiter.stats().items()]
+    await update.message.reply_text("\n".join(lines))
+
 async def unknown_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Неизвестная команда. Используйте меню.", reply_markup=make_main_keyboard())
 
@@ -493,7 +858,25 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.exception("Произошла ошибка: %s", context.error)
 
 def build_app():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor(UPDATE_CONCURRENCY))
+        .connection_pool_size(BOT_CONNECTION_POOL_SIZE)
+    )
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL.rstrip('/')}/bot").base_file_url(f"{BOT_API_URL.rstrip('/')}/file/bot")
+    if RATE_LIMIT_ENABLED:
+        builder = builder.rate_limiter(TokenBucketRateLimiter(
+            global_per_sec=RATE_GLOBAL_PER_SEC,
+            chat_per_sec=RATE_CHAT_PER_SEC,
+            chat_burst=RATE_CHAT_BURST,
+            group_per_min=RATE_GROUP_PER_MIN,
+            max_retries=RATE_MAX_RETRIES,
+        ))
+    if PERSISTENCE_ENABLED:
+        builder = builder.persistence(SQLitePersistence(update_interval=PERSIST_INTERVAL, batch_size=PERSIST_BATCH))
+    app = builder.build()
 
     conv = ConversationHandler(
         entry_points=[CallbackQueryHandler(menu_callback, pattern=r"^action:(sell|buy)$")],
@@ -508,12 +891,21 @@ def build_app():
                 CommandHandler("done", done_photos_command),
             ],
             STATE_CONFIRM: [CallbackQueryHandler(confirm_callback, pattern=r"^confirm:(publish|cancel)$")],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, form_timeout_handler)],
         },
         fallbacks=[CommandHandler("cancel", lambda u, c: u.message.reply_text("Операция отменена."))],
         allow_reentry=True,
+        # состояние формы переживает перезапуск бота (вместе с user_data)
+        name="ad_form",
+        persistent=PERSISTENCE_ENABLED,
+        conversation_timeout=CONVERSATION_TIMEOUT,
     )
 
+    # время активности пользователя для очистки состояния неактивных (до всех остальных хендлеров)
+    app.add_handler(TypeHandler(Update, state_sweeper.touch), group=-2)
     app.add_handler(CommandHandler("start", start_handler))
+    if CHANNEL_USERNAME:
+        app.add_handler(ChatMemberHandler(subscriptions.on_chat_member, ChatMemberHandler.CHAT_MEMBER))
     app.add_handler(conv)
 
     app.add_handler(CallbackQueryHandler(menu_callback, pattern=r"^action:"))
@@ -522,12 +914,26 @@ def build_app():
     app.add_handler(CallbackQueryHandler(select_type_callback, pattern=r"^type:"))
     app.add_handler(CallbackQueryHandler(search_server_callback, pattern=r"^search_server:"))
     app.add_handler(CallbackQueryHandler(search_category_callback, pattern=r"^search_category:"))
-    app.add_handler(CallbackQueryHandler(search_do_callback, pattern=r"^search_do:"))
-    app.add_handler(CallbackQueryHandler(search_nav_callback, pattern=r"^search_nav:"))
+    app.add_handler(CallbackQueryHandler(search_do_callback, pattern=r"^search_(do|cheap):"))
+    app.add_handler(CallbackQueryHandler(search_nav_callback, pattern=r"^search_p?nav:"))
+    app.add_handler(CallbackQueryHandler(search_photo_callback, pattern=r"^search_ph:"))
+    app.add_handler(CallbackQueryHandler(search_media_callback, pattern=r"^search_media:"))
+    app.add_handler(CallbackQueryHandler(search_text_callback, pattern=r"^search_text:"))
+    app.add_handler(CallbackQueryHandler(find_nav_callback, pattern=r"^find_nav:"))
+    app.add_handler(CallbackQueryHandler(find_open_callback, pattern=r"^find_open:"))
     app.add_handler(CallbackQueryHandler(confirm_callback, pattern=r"^confirm:"))
     app.add_handler(CallbackQueryHandler(attach_photos_callback, pattern=r"^attach:"))
     app.add_handler(CallbackQueryHandler(menu_callback, pattern=r"^menu:"))
 
+    # Полнотекстовый поиск
+    app.add_handler(CommandHandler("find", find_command))
+    app.add_handler(CommandHandler("price", price_command))
+    # Сохранённые поиски
+    app.add_handler(CommandHandler("subscribe", subscribe_command))
+    app.add_handler(CommandHandler("subscriptions", subscriptions_command))
+    app.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, find_text_handler))
+
     # Команда удаления своего объявления
     app.add_handler(CommandHandler("del", del_command))
     # Секретные команды доступны любому (если знает)
@@ -535,17 +941,60 @@ def build_app():
     app.add_handler(CommandHandler("vipp", vipp_command))
     app.add_handler(CommandHandler("zakrepp", zakrepp_command))
     app.add_handler(CommandHandler("unzakrep", unzakrep_command))
+    app.add_handler(CommandHandler("stats", stats_command))
 
     app.add_handler(MessageHandler(filters.COMMAND, unknown_handler))
     app.add_error_handler(error_handler)
+    schedule_jobs(app)
     return app
 
+def schedule_jobs(app):
+    """Фоновые задачи на JobQueue."""
+    if app.job_queue is None:
+        logger.warning("JobQueue недоступна (pip install \"python-telegram-bot[job-queue]\"), фоновые задачи отключены")
+        return
+    app.job_queue.run_repeating(user_writes.flush_job, interval=USER_FLUSH_INTERVAL, first=USER_FLUSH_INTERVAL, name="flush_users")
+    app.job_queue.run_repeating(expiry.expiry_job, interval=EXPIRY_INTERVAL, first=1, name="expire_ads")
+    app.job_queue.run_repeating(state_sweeper.sweep_job, interval=STATE_SWEEP_INTERVAL, first=STATE_SWEEP_INTERVAL, name="sweep_state")
+    if app.persistence is not None:
+        app.job_queue.run_repeating(app.persistence.flush_job, interval=PERSIST_INTERVAL, first=PERSIST_INTERVAL, name="flush_state")
+
 async def main():
-    init_db()
+    init_db(FIELD_KEYS)
+    saved_searches.load()
     app = build_app()
-    logger.info("Бот стартует...")
-    await app.run_polling()
+    logger.info("Бот стартует (режим %s)...", BOT_MODE)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+    try:
+        async with app:
+            await app.start()
+            notifier.start(app.bot)
+            if BOT_MODE == "webhook":
+                runner = await start_webhook(app)
+            else:
+                runner = None
+                # chat_member не приходит по умолчанию — запрашиваем все типы обновлений
+                await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await stop.wait()
+            logger.info("Бот останавливается...")
+            if runner is not None:
+                await stop_webhook(app, runner)
+            else:
+                await app.updater.stop()
+            # app.stop() дожидается фоновых задач (подбор совпадений), после него дописываем очередь уведомлений
+            await app.stop()
+            await notifier.stop()
+            await user_writes.flush()
+    finally:
+        repo.shutdown()
+        close_db()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
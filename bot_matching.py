@@ -0,0 +1,48 @@
+"""
+Подбор встречных объявлений: после публикации продажи ищутся покупки с подходящим
+бюджетом (и наоборот) на том же сервере и в той же категории.
+
+Поиск — один индексный запрос (db.find_matches); уведомления обоим авторам уходят
+через фоновую очередь notify.notifier, поэтому публикация их не ждёт.
+"""
+from typing import Dict, List
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from . import repo
+from .config import MATCH_LIMIT
+from .notify import notifier
+
+def _price(value) -> str:
+    return f"{value:,}".replace(",", " ") if value is not None else "—"
+
+def _line(ad: Dict) -> str:
+    what = "Продажа" if ad["action"] == "sell" else "Покупка"
+    return f"#{ad['id']} • {what} • {ad['server']} • {ad['category']} • {ad['type']} • {_price(ad['price'])}"
+
+def _open_buttons(ads: List[Dict]) -> InlineKeyboardMarkup:
+    buttons = [InlineKeyboardButton(f"#{a['id']}", callback_data=f"find_open:{a['id']}") for a in ads]
+    return InlineKeyboardMarkup([buttons[i:i + 5] for i in range(0, len(buttons), 5)])
+
+async def match_ad(ad: Dict) -> int:
+    """Найти встречные объявления для ad и уведомить авторов. Возвращает число совпадений."""
+    ad_id = ad["id"]
+    matches = await repo.find_matches(ad, MATCH_LIMIT)
+    if not matches:
+        return 0
+    # автору нового объявления — один список совпадений
+    notifier.submit(
+        ad["user_id"],
+        f"Нашлись подходящие объявления для вашего #{ad_id}:\n" + "\n".join(_line(m) for m in matches),
+        reply_markup=_open_buttons(matches),
+    )
+    # авторам встречных — по одному сообщению, даже если совпало несколько их объявлений
+    by_author: Dict[int, List[Dict]] = {}
+    for m in matches:
+        by_author.setdefault(m["user_id"], []).append(m)
+    for user_id, own in by_author.items():
+        ids = ", ".join(f"#{m['id']}" for m in own)
+        notifier.submit(
+            user_id,
+            f"Новое объявление подходит под ваше {ids}:\n{_line(ad)}",
+            reply_markup=_open_buttons([ad]),
+        )
+    return len(matches)
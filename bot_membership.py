@@ -0,0 +1,78 @@
+"""
+Кэш проверки подписки на канал (CHANNEL_USERNAME).
+
+Результат get_chat_member хранится с разным TTL для подписанных и
+неподписанных, одновременные проверки одного пользователя сливаются в один
+запрос к Bot API. Если бот — админ канала, обновления chat_member сразу
+обновляют кэш, и большинство публикаций обходится без запроса.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+from telegram import Update
+from telegram.ext import ContextTypes
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+NOT_MEMBER_STATUSES = ("left", "kicked")
+
+class MembershipCache:
+    def __init__(self, channel: Optional[str], positive_ttl: float, negative_ttl: float, maxsize: int):
+        self.channel = channel
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = LRUCache(maxsize)
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.api_calls = 0
+        self.coalesced = 0
+        self.pushed = 0
+
+    def set(self, user_id: int, is_member: bool):
+        self._cache.set(user_id, is_member, ttl=self.positive_ttl if is_member else self.negative_ttl)
+
+    async def is_member(self, bot, user_id: int) -> bool:
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return cached
+        pending = self._inflight.get(user_id)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            self.api_calls += 1
+            member = await bot.get_chat_member(self.channel, user_id)
+            result = member.status not in NOT_MEMBER_STATUSES
+            self.set(user_id, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # ошибку получат ожидающие; если их нет — помечаем как обработанную
+            future.exception()
+            raise
+        finally:
+            del self._inflight[user_id]
+
+    def matches_channel(self, chat) -> bool:
+        if not self.channel or chat is None:
+            return False
+        if str(self.channel).lstrip("-").isdigit():
+            return chat.id == int(self.channel)
+        return (chat.username or "").lower() == str(self.channel).lstrip("@").lower()
+
+    async def on_chat_member(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Хендлер обновлений chat_member канала: подписка/отписка сразу попадает в кэш."""
+        change = update.chat_member
+        if change is None or not self.matches_channel(change.chat):
+            return
+        member = change.new_chat_member
+        self.set(member.user.id, member.status not in NOT_MEMBER_STATUSES)
+        self.pushed += 1
+
+    def stats(self) -> Dict:
+        stats = self._cache.stats()
+        stats.update({"api_calls": self.api_calls, "coalesced": self.coalesced, "pushed": self.pushed})
+        return stats
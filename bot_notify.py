@@ -0,0 +1,102 @@
+"""
+Фоновая отправка уведомлений (совпадения объявлений и т.п.).
+
+Обработчик только кладёт сообщение в ограниченную очередь и сразу отвечает
+пользователю; несколько воркеров отправляют сообщения с приоритетом "bulk",
+чтобы они не задерживали ответы на действия пользователей (см. ratelimit.py).
+При переполнении очереди новые уведомления отбрасываются и считаются в dropped.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from telegram import InlineKeyboardMarkup
+from telegram.error import Forbidden, TelegramError
+from .config import NOTIFY_QUEUE_SIZE, NOTIFY_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class Notifier:
+    def __init__(self, maxsize: int, workers: int):
+        self.maxsize = max(1, maxsize)
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._bot = None
+        self.queued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.failed = 0
+
+    def start(self, bot):
+        self._bot = bot
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"notify-{i}") for i in range(self.workers)]
+
+    def submit(self, chat_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+        """Поставить сообщение в очередь; False — очередь переполнена (или отправка не запущена)."""
+        if self._queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait((chat_id, text, reply_markup))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.queued += 1
+        return True
+
+    async def put(self, chat_id: int, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None):
+        """Как submit(), но при заполненной очереди ждёт места — для рассылок из фоновых задач."""
+        if self._queue is None:
+            self.dropped += 1
+            return
+        await self._queue.put((chat_id, text, reply_markup))
+        self.queued += 1
+
+    async def _worker(self):
+        while True:
+            chat_id, text, reply_markup = await self._queue.get()
+            try:
+                # без лимитера (RATE_LIMIT_ENABLED=0) PTB не принимает rate_limit_args
+                extra = {"rate_limit_args": {"priority": "bulk"}} if self._bot.rate_limiter is not None else {}
+                await self._bot.send_message(chat_id, text, reply_markup=reply_markup, **extra)
+                self.sent += 1
+            except Forbidden:
+                # пользователь заблокировал бота или не начинал с ним диалог
+                self.blocked += 1
+            except TelegramError as e:
+                self.failed += 1
+                logger.warning("Не удалось отправить уведомление %s: %s", chat_id, e)
+            except Exception:
+                self.failed += 1
+                logger.exception("Ошибка при отправке уведомления %s", chat_id)
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 5.0):
+        """Дождаться отправки очереди (не дольше timeout) и остановить воркеры."""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не отправлено уведомлений при остановке: %s", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> Dict:
+        return {
+            "queue": self._queue.qsize() if self._queue is not None else 0,
+            "maxsize": self.maxsize,
+            "queued": self.queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "failed": self.failed,
+        }
+
+notifier = Notifier(NOTIFY_QUEUE_SIZE, NOTIFY_WORKERS)
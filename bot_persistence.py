@@ -0,0 +1,155 @@
+"""
+Persistence для PTB поверх той же SQLite: user_data (JSON) и состояния ConversationHandler.
+
+- При старте user_data не читается целиком: данные пользователя подгружаются
+  из user_state при первом его обновлении (refresh_user_data), поэтому время
+  старта не зависит от числа пользователей.
+- PTB раз в update_interval передаёт только изменившиеся user_data/состояния;
+  они копятся в буфере и пишутся одной транзакцией (executemany) фоновой задачей
+  JobQueue, при накоплении PERSIST_BATCH изменений и при остановке (flush).
+"""
+import json
+import logging
+from typing import Dict, Optional, Set, Tuple
+from telegram.ext import BasePersistence, ContextTypes, PersistenceInput
+from . import db, repo
+
+logger = logging.getLogger(__name__)
+
+_DROPPED = object()
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, update_interval: float = 10, batch_size: int = 500):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False), update_interval=update_interval)
+        self.batch_size = max(1, batch_size)
+        self._loaded: Set[int] = set()
+        self._users: Dict[int, object] = {}
+        self._conversations: Dict[Tuple[str, str], object] = {}
+        self.lazy_loads = 0
+        self.written = 0
+        self.flushes = 0
+        self.errors = 0
+
+    # --- чтение ---
+
+    async def get_user_data(self) -> Dict[int, Dict]:
+        # ничего не читаем заранее — см. refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, Dict]:
+        return {}
+
+    async def get_bot_data(self) -> Dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        # незавершённых форм немного: их состояния читаются при старте целиком
+        rows = await repo.run(db.get_conversations, name)
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        # вызывается PTB перед каждым обновлением пользователя: первый раз подгружаем его данные из БД
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+        pending = self._users.get(user_id)
+        if pending is _DROPPED:
+            return
+        if pending is not None:
+            # ещё не записанные изменения новее, чем строка в БД
+            data = pending
+        else:
+            raw = await repo.run(db.get_user_state, user_id)
+            if not raw:
+                return
+            data = json.loads(raw)
+            self.lazy_loads += 1
+        for key, value in data.items():
+            user_data.setdefault(key, value)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+
+    # --- запись (в буфер) ---
+
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        self._users[user_id] = data if data else _DROPPED
+        await self._maybe_flush()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users[user_id] = _DROPPED
+        self._loaded.discard(user_id)
+        await self._maybe_flush()
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._conversations[(name, json.dumps(list(key)))] = _DROPPED if new_state is None else new_state
+        await self._maybe_flush()
+
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    # --- сброс буфера в БД ---
+
+    async def _maybe_flush(self):
+        if len(self._users) + len(self._conversations) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._users and not self._conversations:
+            return
+        users_batch, self._users = self._users, {}
+        conv_batch, self._conversations = self._conversations, {}
+        users, dropped_users = [], []
+        for user_id, data in users_batch.items():
+            if data is _DROPPED:
+                dropped_users.append(user_id)
+                continue
+            try:
+                users.append((user_id, json.dumps(data, ensure_ascii=False)))
+            except (TypeError, ValueError) as e:
+                self.errors += 1
+                logger.warning("user_data %s не сериализуется в JSON: %s", user_id, e)
+        conversations = [(name, key, json.dumps(state)) for (name, key), state in conv_batch.items() if state is not _DROPPED]
+        dropped_conversations = [(name, key) for (name, key), state in conv_batch.items() if state is _DROPPED]
+        try:
+            await repo.run(db.save_state, users, dropped_users, conversations, dropped_conversations)
+        except Exception:
+            # вернуть несохранённое, не затирая более свежие изменения
+            for user_id, data in users_batch.items():
+                self._users.setdefault(user_id, data)
+            for key, state in conv_batch.items():
+                self._conversations.setdefault(key, state)
+            raise
+        self.written += len(users_batch) + len(conv_batch)
+        self.flushes += 1
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Не удалось сохранить состояние пользователей: %s", e)
+
+    def stats(self) -> Dict:
+        return {
+            "loaded_users": len(self._loaded),
+            "lazy_loads": self.lazy_loads,
+            "pending": len(self._users) + len(self._conversations),
+            "written": self.written,
+            "flushes": self.flushes,
+            "errors": self.errors,
+        }
@@ -0,0 +1,95 @@
+"""
+Разбор цен из свободного текста полей объявления ("1.5kk", "150 000$", "2 млн", "300к").
+
+Результат — целое число в игровой валюте или None, если цену не удалось понять ("договорная").
+Неоднозначные записи: "1к5" / "2кк5" — дробь после суффикса (1.5к, 2.5кк); диапазон "100-150к"
+или "100к-150к" — нижняя граница (100 000), у "100-150к" суффикс общий для обоих чисел.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+# Поля формы, из которых берутся цена/бюджет и доход бизнеса (см. FIELDS_TEMPLATE / FIELDS_TEMPLATE_BUY)
+PRICE_KEYS = ("Цена", "Бюджет")
+INCOME_KEYS = ("Доход за 1 день", "Желаемый доход за 1 день")
+
+PRICE_MAX = 10 ** 15
+
+_NUMBER = re.compile(r"\d[\d\s.,']*")
+_SUFFIX = re.compile(r"\s*(млрд|млн|лям\w*|тыс\w*|kkk|ккк|kk|кк|k|к|m|b|т)(?![a-zа-я])", re.IGNORECASE)
+_MULTIPLIERS = {
+    "млрд": 10 ** 9, "b": 10 ** 9, "kkk": 10 ** 9, "ккк": 10 ** 9,
+    "млн": 10 ** 6, "лям": 10 ** 6, "m": 10 ** 6, "kk": 10 ** 6, "кк": 10 ** 6,
+    "тыс": 10 ** 3, "k": 10 ** 3, "к": 10 ** 3, "т": 10 ** 3,
+}
+
+def _to_number(raw: str) -> Optional[float]:
+    s = re.sub(r"[\s']", "", raw).rstrip(".,")
+    if not s:
+        return None
+    dots, commas = s.count("."), s.count(",")
+    if dots and commas:
+        # "1,500.50" / "1.500,50": последний разделитель — десятичный
+        dec = "." if s.rfind(".") > s.rfind(",") else ","
+        s = s.replace("," if dec == "." else ".", "").replace(dec, ".")
+    elif dots + commas > 1:
+        # "1.500.000": несколько одинаковых разделителей — разряды
+        s = s.replace(".", "").replace(",", "")
+    elif dots + commas == 1:
+        head, tail = re.split(r"[.,]", s)
+        # "150.000" без суффикса — разряды, "1.5" / "1,25" — дробь
+        s = head + tail if len(tail) == 3 else f"{head}.{tail}"
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def _multiplier(suffix: str) -> int:
+    suffix = suffix.lower()
+    for key in ("лям", "тыс"):
+        if suffix.startswith(key):
+            return _MULTIPLIERS[key]
+    return _MULTIPLIERS.get(suffix, 1)
+
+def parse_price(text) -> Optional[int]:
+    """Первая сумма из текста. Для диапазона "100-150к" берётся нижняя граница с общим суффиксом."""
+    if text is None:
+        return None
+    text = str(text)
+    m = _NUMBER.search(text)
+    if not m:
+        return None
+    raw = m.group(0)
+    rest = text[m.end():]
+    suffix = _SUFFIX.match(rest)
+    fraction = None
+    if suffix is not None and suffix.group(0) == suffix.group(1) and raw.isdigit():
+        # "1к5" = 1.5к: цифры вплотную после суффикса — дробная часть
+        fraction = re.match(r"\d+", rest[suffix.end():])
+    if suffix is None:
+        # "100-150к": суффикс стоит после второго числа
+        rng = re.match(r"\s*[-–—]\s*\d[\d\s.,']*", rest)
+        if rng:
+            suffix = _SUFFIX.match(rest[rng.end():])
+    mult = _multiplier(suffix.group(1)) if suffix else 1
+    if mult > 1 and fraction:
+        value = float(f"{raw}.{fraction.group(0)}")
+    elif mult > 1 and re.fullmatch(r"\d+[.,]\d{3}", raw.strip()):
+        # "1.500кк" с суффиксом — это дробь, а не разряды
+        raw = raw.strip().replace(",", ".")
+        value = float(raw)
+    else:
+        value = _to_number(raw)
+    if value is None:
+        return None
+    result = int(round(value * mult))
+    return result if 0 <= result <= PRICE_MAX else None
+
+def _first(fields: Dict, keys) -> Optional[int]:
+    for key in keys:
+        if key in fields:
+            return parse_price(fields[key])
+    return None
+
+def extract_prices(fields: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """(цена или бюджет, доход за день) из полей объявления."""
+    return _first(fields, PRICE_KEYS), _first(fields, INCOME_KEYS)
@@ -0,0 +1,167 @@
+"""
+Ограничитель исходящих запросов к Bot API (token bucket).
+
+Лимиты Telegram: ~30 сообщений/с на бота, ~1 сообщение/с в личный чат,
+~20 сообщений/мин в группу. Ограничиваются только методы, которые отправляют
+или меняют сообщения; остальные (answerCallbackQuery, getChatMember, ...)
+проходят сразу. На RetryAfter все отправки приостанавливаются на retry_after
+секунд, запрос повторяется.
+
+Приоритет задаётся через rate_limit_args={"priority": "bulk"}: фоновые
+рассылки ждут, пока в очереди есть интерактивные ответы пользователям.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> float:
+        """Забрать токен; вернуть 0 или сколько секунд ждать следующего."""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+class TokenBucketRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    def __init__(self, global_per_sec: float = 30, chat_per_sec: float = 1, chat_burst: float = 3, group_per_min: float = 20, group_burst: float = 5, max_retries: int = 3, max_buckets: int = 10000):
+        self._global = TokenBucket(global_per_sec, global_per_sec)
+        self._chat_rate = chat_per_sec
+        self._chat_burst = chat_burst
+        self._group_rate = group_per_min / 60
+        self._group_burst = group_burst
+        self._max_retries = max_retries
+        self._max_buckets = max_buckets
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._blocked_until = 0.0
+        self.waiting = {INTERACTIVE: 0, BULK: 0}
+        self.requests = 0
+        self.throttled = 0
+        self.retry_afters = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._max_buckets:
+                # полные корзины ничего не помнят — их можно выбросить
+                for key in [k for k, b in self._chats.items() if b.idle()]:
+                    del self._chats[key]
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self._group_rate, self._group_burst)
+            else:
+                bucket = TokenBucket(self._chat_rate, self._chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: Optional[Union[int, str]], priority: str):
+        start = time.monotonic()
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            while True:
+                delay = bucket.try_take()
+                if not delay:
+                    break
+                await asyncio.sleep(delay)
+        # ожидающим считается только запрос, который ждёт глобальную корзину: ответ, упёршийся
+        # в лимит своего чата, не конкурирует с рассылками и не должен их задерживать
+        self.waiting[priority] += 1
+        try:
+            while True:
+                delay = self._blocked_until - time.monotonic()
+                if delay <= 0 and priority == BULK and self.waiting[INTERACTIVE]:
+                    # уступаем интерактивным ответам
+                    delay = 1 / self._global.rate
+                if delay <= 0:
+                    delay = self._global.try_take()
+                    if not delay:
+                        break
+                await asyncio.sleep(delay)
+        finally:
+            self.waiting[priority] -= 1
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            self.throttled += 1
+            self.wait_time += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        rate_limit_args = rate_limit_args or {}
+        priority = rate_limit_args.get("priority", INTERACTIVE)
+        max_retries = rate_limit_args.get("max_retries", self._max_retries)
+        limited = endpoint.startswith(_LIMITED_PREFIXES)
+        chat_id = data.get("chat_id") if limited else None
+        if isinstance(chat_id, str):
+            try:
+                chat_id = int(chat_id)
+            except ValueError:
+                pass
+        self.requests += 1
+        for attempt in range(max_retries + 1):
+            if limited:
+                await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                self.retry_afters += 1
+                retry_after = float(exc.retry_after)
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after + 0.1)
+                if attempt == max_retries:
+                    logger.warning("RetryAfter для %s после %d повторов", endpoint, max_retries)
+                    raise
+                logger.info("RetryAfter %.1f с для %s, повтор", retry_after, endpoint)
+                if not limited:
+                    await asyncio.sleep(retry_after + 0.1)
+        return None  # не достигается: цикл либо возвращает результат, либо пробрасывает RetryAfter
+
+    def stats(self) -> Dict:
+        return {
+            "queue_interactive": self.waiting[INTERACTIVE],
+            "queue_bulk": self.waiting[BULK],
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "retry_after": self.retry_afters,
+            "wait_time_s": round(self.wait_time, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "chat_buckets": len(self._chats),
+        }
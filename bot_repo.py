@@ -0,0 +1,133 @@
+"""
+Асинхронный доступ к данным для хендлеров: await repo.get_ads(...).
+
+Синхронные функции db.py выполняются в отдельном пуле потоков, поэтому запросы
+к SQLite не блокируют event loop python-telegram-bot. Число одновременных
+операций с БД ограничено DB_MAX_INFLIGHT. Изменяющие операции сбрасывают
+кэш карточек объявлений (cache.ad_cards).
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Sequence
+from . import db
+from .cache import ad_cards, deleted_ads
+from .config import DB_POOL_SIZE, DB_MAX_INFLIGHT
+
+_executor: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_inflight = 0
+_ops = 0
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        # каждый поток держит своё соединение из пула; одно оставляем свободным для синхронного кода
+        _executor = ThreadPoolExecutor(max_workers=max(1, DB_POOL_SIZE - 1), thread_name_prefix="db")
+    return _executor
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, DB_MAX_INFLIGHT))
+    return _semaphore
+
+async def run(fn, *args, **kwargs):
+    """Выполнить синхронную функцию БД в DB-потоке."""
+    global _inflight, _ops
+    async with _get_semaphore():
+        _inflight += 1
+        _ops += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+        finally:
+            _inflight -= 1
+
+def shutdown():
+    global _executor, _semaphore
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    _semaphore = None
+
+def stats() -> Dict:
+    return {"inflight": _inflight, "max_inflight": DB_MAX_INFLIGHT, "ops": _ops}
+
+async def ensure_user(user_id: int, username: Optional[str]):
+    return await run(db.ensure_user, user_id, username)
+
+async def set_vip(user_id: int, vip: bool = True):
+    # меняется только users.vip; карточки рисуются из строки ads, поэтому кэш не сбрасывается
+    return await run(db.set_vip, user_id, vip)
+
+async def get_user(user_id: int, columns: Sequence[str] = db.USER_COLUMNS):
+    return await run(db.get_user, user_id, columns)
+
+async def add_ad(user_id: int, username: str, server: str, category: str, type_: str, action: str, fields: Dict, photos: List[str], vip: bool=False, pinned: bool=False) -> int:
+    return await run(db.add_ad, user_id, username, server, category, type_, action, fields, photos, vip=vip, pinned=pinned)
+
+async def get_ad(ad_id: int) -> Optional[Dict]:
+    ad = await run(db.get_ad, ad_id)
+    # чтение могло начаться до удаления: такое объявление не отдаём (и оно не попадёт в кэш карточек)
+    return None if deleted_ads.get(ad_id) else ad
+
+def _forget(ad_id: int):
+    deleted_ads.set(ad_id, True)
+    ad_cards.invalidate(ad_id)
+
+async def delete_ad(ad_id: int) -> bool:
+    ad_cards.invalidate(ad_id)
+    result = await run(db.delete_ad, ad_id)
+    if result:
+        _forget(ad_id)
+    else:
+        ad_cards.invalidate(ad_id)
+    return result
+
+async def get_ads(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, limit: int=100, include_pinned_first: bool=True,
+                  columns: Optional[Sequence[str]] = None) -> list:
+    return await run(db.get_ads, server=server, category=category, action=action, limit=limit, include_pinned_first=include_pinned_first, columns=columns)
+
+async def get_ads_page(server: Optional[str]=None, category: Optional[str]=None, action: Optional[str]=None, cursor: Optional[tuple]=None, direction: str="next",
+                       sort: str="date", price_min: Optional[int]=None, price_max: Optional[int]=None):
+    return await run(db.get_ads_page, server=server, category=category, action=action, cursor=cursor, direction=direction,
+                     sort=sort, price_min=price_min, price_max=price_max)
+
+async def find_matches(ad: Dict, limit: int=10) -> List[Dict]:
+    return await run(db.find_matches, ad, limit)
+
+async def add_saved_search(user_id: int, server: Optional[str], category: Optional[str], action: Optional[str], price_min: Optional[int]=None, price_max: Optional[int]=None) -> Dict:
+    return await run(db.add_saved_search, user_id, server, category, action, price_min, price_max)
+
+async def delete_saved_search(search_id: int, user_id: int) -> bool:
+    return await run(db.delete_saved_search, search_id, user_id)
+
+async def get_user_saved_searches(user_id: int) -> List[Dict]:
+    return await run(db.get_user_saved_searches, user_id)
+
+async def search_ads(text: str, server: Optional[str]=None, category: Optional[str]=None, limit: int=10, offset: int=0):
+    return await run(db.search_ads, text, server=server, category=category, limit=limit, offset=offset)
+
+async def get_user_ads(user_id: int, columns: Sequence[str] = db.AD_SUMMARY) -> list:
+    return await run(db.get_user_ads, user_id, columns)
+
+async def set_pin(ad_id: int, pinned: bool=True, hours: Optional[float]=None) -> bool:
+    result = await run(db.set_pin, ad_id, pinned, hours)
+    ad_cards.invalidate(ad_id)
+    return result
+
+async def get_user_archive(user_id: int, limit: int=20) -> List[Dict]:
+    return await run(db.get_user_archive, user_id, limit)
+
+async def unpin_expired(now: int, batch: int=500) -> List[int]:
+    ids = await run(db.unpin_expired, now, batch)
+    for ad_id in ids:
+        ad_cards.invalidate(ad_id)
+    return ids
+
+async def archive_expired(now: int, batch: int=500) -> List[int]:
+    ids = await run(db.archive_expired, now, batch)
+    for ad_id in ids:
+        _forget(ad_id)
+    return ids
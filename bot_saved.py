@@ -0,0 +1,104 @@
+"""
+Сохранённые поиски (/subscribe) и рассылка новых объявлений подписчикам.
+
+Все подписки держатся в памяти в инвертированном индексе
+(server, category, action) -> {id подписки: (user_id, price_min, price_max)},
+поэтому при публикации просматриваются только подписки с тем же сервером и
+категорией (action=None — подписка на обе стороны), а не все подряд.
+Таблица saved_searches — источник при старте; индекс меняется вместе с ней.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from . import db, repo
+from .notify import notifier
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[Optional[str], Optional[str], Optional[str]]
+
+class SavedSearchIndex:
+    def __init__(self):
+        self._index: Dict[Key, Dict[int, Tuple[int, Optional[int], Optional[int]]]] = {}
+        self._count = 0
+        self.published = 0
+        self.checked = 0
+        self.notified = 0
+
+    def _add(self, s: Dict):
+        bucket = self._index.setdefault((s["server"], s["category"], s["action"]), {})
+        if s["id"] not in bucket:
+            self._count += 1
+        bucket[s["id"]] = (s["user_id"], s["price_min"], s["price_max"])
+
+    def _remove(self, s: Dict):
+        key = (s["server"], s["category"], s["action"])
+        bucket = self._index.get(key)
+        if bucket and bucket.pop(s["id"], None) is not None:
+            self._count -= 1
+            if not bucket:
+                del self._index[key]
+
+    def load(self):
+        """Загрузить все подписки из БД (синхронно, при старте)."""
+        self._index.clear()
+        self._count = 0
+        for s in db.iter_saved_searches():
+            self._add(s)
+        db.release_conn()
+        logger.info("Загружено сохранённых поисков: %s", self._count)
+
+    async def subscribe(self, user_id: int, server: Optional[str], category: Optional[str], action: Optional[str],
+                        price_min: Optional[int] = None, price_max: Optional[int] = None) -> Dict:
+        s = await repo.add_saved_search(user_id, server, category, action, price_min, price_max)
+        self._add(s)
+        return s
+
+    async def unsubscribe(self, user_id: int, search_id: int) -> bool:
+        own = [s for s in await repo.get_user_saved_searches(user_id) if s["id"] == search_id]
+        if not own or not await repo.delete_saved_search(search_id, user_id):
+            return False
+        self._remove(own[0])
+        return True
+
+    def match(self, ad: Dict) -> List[int]:
+        """user_id подписчиков, которым подходит объявление (без автора, без повторов)."""
+        users = []
+        seen = {ad["user_id"]}
+        price = ad.get("price")
+        for key in ((ad["server"], ad["category"], ad["action"]), (ad["server"], ad["category"], None)):
+            for user_id, price_min, price_max in self._index.get(key, {}).values():
+                self.checked += 1
+                if user_id in seen:
+                    continue
+                if price_min is not None or price_max is not None:
+                    if price is None or (price_min is not None and price < price_min) or (price_max is not None and price > price_max):
+                        continue
+                seen.add(user_id)
+                users.append(user_id)
+        return users
+
+    async def fan_out(self, ad: Dict, text: str) -> int:
+        """Разослать уведомление о новом объявлении подписчикам через фоновую очередь."""
+        self.published += 1
+        users = self.match(ad)
+        markup = InlineKeyboardMarkup([[InlineKeyboardButton(f"Открыть #{ad['id']}", callback_data=f"find_open:{ad['id']}")]])
+        for user_id in users:
+            # рассылка идёт из фоновой задачи — ждём места в очереди, а не теряем уведомления
+            await notifier.put(user_id, text, reply_markup=markup)
+        self.notified += len(users)
+        return len(users)
+
+    def __len__(self):
+        return self._count
+
+    def stats(self) -> Dict:
+        return {
+            "subscriptions": self._count,
+            "keys": len(self._index),
+            "published": self.published,
+            "checked": self.checked,
+            "notified": self.notified,
+        }
+
+saved_searches = SavedSearchIndex()
@@ -0,0 +1,86 @@
+"""
+Очистка состояния пользователей (context.user_data) по неактивности.
+
+Каждое обновление отмечает время активности пользователя (touch, группа -2).
+Фоновая задача sweep_job удаляет user_data тех, кто неактивен дольше
+STATE_IDLE_TTL, а при превышении STATE_MAX_USERS — самых давно неактивных (LRU).
+Удаление идёт через Application.drop_user_data, поэтому убирает и сохранённую
+копию в persistence. Гауж state_bytes — суммарный размер user_data в JSON.
+"""
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict
+from telegram import Update
+from telegram.ext import ContextTypes
+from .config import STATE_IDLE_TTL, STATE_MAX_USERS
+
+logger = logging.getLogger(__name__)
+
+class StateSweeper:
+    def __init__(self, idle_ttl: float, max_users: int):
+        self.idle_ttl = idle_ttl
+        self.max_users = max(1, max_users)
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self.timeouts = 0
+        self.state_bytes = 0
+        self.last_sweep_ms = 0.0
+
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if user is None:
+            return
+        self._seen[user.id] = time.monotonic()
+        self._seen.move_to_end(user.id)
+
+    def _victims(self, now: float):
+        deadline = now - self.idle_ttl
+        while self._seen:
+            user_id, seen = next(iter(self._seen.items()))
+            if seen < deadline:
+                self._seen.popitem(last=False)
+                self.evicted_idle += 1
+                yield user_id
+            elif len(self._seen) > self.max_users:
+                self._seen.popitem(last=False)
+                self.evicted_lru += 1
+                yield user_id
+            else:
+                return
+
+    def sweep(self, application) -> int:
+        start = time.perf_counter()
+        evicted = 0
+        for user_id in self._victims(time.monotonic()):
+            application.drop_user_data(user_id)
+            evicted += 1
+        total = 0
+        for data in application.user_data.values():
+            if data:
+                try:
+                    total += len(json.dumps(data, ensure_ascii=False).encode())
+                except (TypeError, ValueError):
+                    pass
+        self.state_bytes = total
+        self.last_sweep_ms = (time.perf_counter() - start) * 1000
+        if evicted:
+            logger.info("Очищено состояние неактивных пользователей: %s", evicted)
+        return evicted
+
+    async def sweep_job(self, context: ContextTypes.DEFAULT_TYPE):
+        self.sweep(context.application)
+
+    def stats(self) -> Dict:
+        return {
+            "tracked_users": len(self._seen),
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+            "form_timeouts": self.timeouts,
+            "state_bytes": self.state_bytes,
+            "last_sweep_ms": round(self.last_sweep_ms, 3),
+        }
+
+state_sweeper = StateSweeper(STATE_IDLE_TTL, STATE_MAX_USERS)
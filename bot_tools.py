@@ -0,0 +1,173 @@
+"""
+Перенос данных между БД (staging <-> production): выгрузка и загрузка ads/users в JSONL или CSV.
+
+    python -m bot.tools export ads ads.jsonl
+    python -m bot.tools export users users.csv
+    python -m bot.tools import ads ads.jsonl [--batch 1000] [--restart]
+    python -m bot.tools checkplans
+
+БД — DB_PATH из .env, как у бота; схема создаётся/обновляется init_db(). Строки читаются и пишутся
+генераторами, поэтому таблица целиком в память не загружается. Формат — по расширению (.csv, иначе
+JSONL) или --format. У объявления fields — объект, photos — список (в CSV — JSON-текстом в ячейке).
+
+Загрузка пишет executemany-пачками по --batch строк, каждая пачка — своя транзакция. Вместе с пачкой
+в import_progress сохраняется число записанных строк файла, поэтому после прерывания тот же запуск
+продолжает с места остановки (--restart — загрузить файл заново); после полной загрузки позиция
+сбрасывается. Объявления загружаются со своими id:
+объявление с тем же id заменяется, пользователи обновляются.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List
+from . import db
+
+TABLES = {
+    "ads": db.AD_COLUMNS.split(", ") + ["fields", "photos"],
+    "users": list(db.USER_COLUMNS),
+}
+# Колонки, которые в CSV нужно привести к int (пустая ячейка — NULL)
+INT_COLUMNS = {
+    "id", "user_id", "vip", "pinned", "created_at", "price", "income", "pinned_until", "expires_at",
+}
+JSON_COLUMNS = {"fields", "photos"}
+
+def _format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def _source(table: str, path: str) -> str:
+    return f"{table}:{os.path.abspath(path)}"
+
+def iter_rows(table: str) -> Iterator[Dict]:
+    return db.iter_ads() if table == "ads" else db.iter_users()
+
+def write_rows(rows: Iterable[Dict], f, fmt: str, columns: List[str]) -> Iterator[int]:
+    """Записать строки в файл; отдаёт номер каждой записанной строки (для отчёта о скорости)."""
+    if fmt == "csv":
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for n, row in enumerate(rows, 1):
+            writer.writerow([json.dumps(row.get(c), ensure_ascii=False) if c in JSON_COLUMNS else row.get(c) for c in columns])
+            yield n
+    else:
+        for n, row in enumerate(rows, 1):
+            f.write(json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False) + "\n")
+            yield n
+
+def read_rows(f, fmt: str) -> Iterator[Dict]:
+    if fmt == "csv":
+        for raw in csv.DictReader(f):
+            row = {}
+            for c, value in raw.items():
+                if c in JSON_COLUMNS:
+                    row[c] = json.loads(value) if value else None
+                elif c in INT_COLUMNS:
+                    row[c] = int(value) if value not in ("", None) else None
+                else:
+                    row[c] = value if value != "" else None
+            yield row
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class Progress:
+    """Строк и строк в секунду — в stderr не чаще раза в interval секунд и в конце."""
+
+    def __init__(self, label: str, interval: float = 2.0):
+        self.label = label
+        self.interval = interval
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.rows = 0
+
+    def update(self, rows: int):
+        self.rows = rows
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._print(now)
+
+    def done(self) -> Dict:
+        return self._print(time.perf_counter())
+
+    def _print(self, now: float) -> Dict:
+        elapsed = now - self.start
+        rate = self.rows / elapsed if elapsed > 0 else 0.0
+        print(f"{self.label}: {self.rows} строк за {elapsed:.1f} с ({rate:.0f} строк/с)", file=sys.stderr)
+        return {"rows": self.rows, "seconds": round(elapsed, 3), "rows_per_sec": round(rate, 1)}
+
+def export_table(table: str, path: str, fmt: str = "") -> Dict:
+    fmt = _format(path, fmt)
+    progress = Progress(f"export {table}")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for n in write_rows(iter_rows(table), f, fmt, TABLES[table]):
+            progress.update(n)
+    return progress.done()
+
+def import_table(table: str, path: str, fmt: str = "", batch: int = 1000, restart: bool = False) -> Dict:
+    fmt = _format(path, fmt)
+    source = _source(table, path)
+    if restart:
+        db.set_import_progress(source, 0)
+    done = db.get_import_progress(source)
+    if done:
+        print(f"import {table}: продолжение с строки {done + 1}", file=sys.stderr)
+    write = db.import_ads if table == "ads" else db.import_users
+    progress = Progress(f"import {table}")
+    position = done
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = itertools.islice(read_rows(f, fmt), done, None)
+        while True:
+            chunk = list(itertools.islice(rows, max(1, batch)))
+            if not chunk:
+                break
+            position += len(chunk)
+            write(chunk, progress=(source, position))
+            progress.update(position - done)
+    # файл прочитан до конца — следующий запуск с тем же путём (например, новая выгрузка) грузит его заново
+    db.set_import_progress(source, 0)
+    return progress.done()
+
+def check_plans() -> int:
+    problems = db.check_query_plans()
+    for problem in problems:
+        print(problem)
+    print(f"Запросов с полным сканированием или временной сортировкой: {len(problems)}", file=sys.stderr)
+    return 1 if problems else 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bot.tools", description="Выгрузка и загрузка данных бота")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("export", "import"):
+        p = sub.add_parser(name)
+        p.add_argument("table", choices=sorted(TABLES))
+        p.add_argument("path")
+        p.add_argument("--format", choices=("jsonl", "csv"), default="")
+        if name == "import":
+            p.add_argument("--batch", type=int, default=1000, help="строк в одной транзакции")
+            p.add_argument("--restart", action="store_true", help="не продолжать прерванную загрузку, а начать заново")
+    sub.add_parser("checkplans", help="проверить планы запросов бота на этой БД")
+    args = parser.parse_args(argv)
+
+    db.init_db()
+    try:
+        if args.command == "export":
+            result = export_table(args.table, args.path, args.format)
+        elif args.command == "import":
+            result = import_table(args.table, args.path, args.format, args.batch, args.restart)
+        else:
+            return check_plans()
+        print(json.dumps({"command": args.command, "table": args.table, **result}))
+        return 0
+    finally:
+        db.close_db()
+
+if __name__ == "__main__":
+    sys.exit(main())
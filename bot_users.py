@@ -0,0 +1,73 @@
+"""
+Буфер записей пользователей: /start не пишет в БД, если username не менялся.
+
+В памяти хранится карта известных пользователей (user_id -> username).
+Повторный /start с тем же username запись пропускает; изменения копятся в
+буфере и пишутся пачкой (executemany) по таймеру JobQueue, при достижении
+USER_FLUSH_SIZE и при остановке бота.
+"""
+import logging
+from typing import Dict, Optional
+from telegram.ext import ContextTypes
+from . import db, repo
+from .cache import LRUCache
+from .config import KNOWN_USERS_MAX, USER_FLUSH_SIZE
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class UserWriteBuffer:
+    def __init__(self, known_max: int, flush_size: int):
+        self.flush_size = max(1, flush_size)
+        self._known = LRUCache(known_max)
+        self._pending: Dict[int, Optional[str]] = {}
+        self.avoided = 0
+        self.buffered = 0
+        self.written = 0
+        self.flushes = 0
+
+    async def ensure_user(self, user_id: int, username: Optional[str]):
+        if self._known.get(user_id, _MISSING) == username:
+            self.avoided += 1
+            return
+        self._known.set(user_id, username)
+        if user_id in self._pending:
+            self.avoided += 1
+        else:
+            self.buffered += 1
+        self._pending[user_id] = username
+        if len(self._pending) >= self.flush_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await repo.run(db.ensure_users, list(batch.items()))
+        except Exception:
+            # вернуть несохранённое, не затирая более свежие значения
+            for user_id, username in batch.items():
+                self._pending.setdefault(user_id, username)
+            raise
+        self.written += len(batch)
+        self.flushes += 1
+
+    async def flush_job(self, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning("Не удалось записать пользователей: %s", e)
+
+    def stats(self) -> Dict:
+        return {
+            "known": len(self._known),
+            "pending": len(self._pending),
+            "avoided_writes": self.avoided,
+            "buffered": self.buffered,
+            "written": self.written,
+            "flushes": self.flushes,
+        }
+
+user_writes = UserWriteBuffer(KNOWN_USERS_MAX, USER_FLUSH_SIZE)
@@ -0,0 +1,65 @@
+"""
+Режим webhook: встроенный aiohttp-сервер принимает обновления от Telegram.
+
+Хендлер только проверяет секрет, разбирает JSON и кладёт Update в очередь
+приложения, сразу отвечая 200 — обработка идёт в фоне. Локально можно
+проверить, отправив записанный Update:
+
+    curl -X POST http://127.0.0.1:8443/telegram \
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+         -H "Content-Type: application/json" -d @update.json
+"""
+import hmac
+import json
+import logging
+from typing import Optional
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+from .config import WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL, WEBHOOK_MAX_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def make_webhook_app(app: Application, path: str = WEBHOOK_PATH, secret: Optional[str] = WEBHOOK_SECRET) -> web.Application:
+    async def handle_update(request: web.Request) -> web.Response:
+        # compare_digest не сравнивает str с не-ASCII символами (TypeError -> 500), поэтому сравниваются байты
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode("utf-8", "surrogateescape"), secret.encode()):
+            return web.Response(status=403)
+        try:
+            data = await request.json(loads=json.loads)
+            update = Update.de_json(data, app.bot)
+        except Exception:
+            logger.warning("Некорректное тело webhook-запроса")
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+        await app.update_queue.put(update)
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"ok": True, "queue": app.update_queue.qsize()})
+
+    web_app = web.Application()
+    web_app.router.add_post(path, handle_update)
+    web_app.router.add_get("/healthz", health)
+    return web_app
+
+async def start_webhook(app: Application) -> web.AppRunner:
+    runner = web.AppRunner(make_webhook_app(app), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+    logger.info("Webhook слушает %s:%s%s", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH)
+    # без WEBHOOK_URL сервер просто принимает обновления (удобно для локальной проверки)
+    if WEBHOOK_URL:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    return runner
+
+async def stop_webhook(app: Application, runner: web.AppRunner):
+    await runner.cleanup()
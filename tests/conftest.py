@@ -0,0 +1,7 @@
+"""Окружение для тестов: bot.config читает переменные при импорте."""
+import os
+import tempfile
+
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot_tests_"), "bot.db"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
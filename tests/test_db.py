@@ -0,0 +1,20 @@
+from bot import db
+
+def test_add_ad_writes_fts_document_once_after_fields():
+    db.init_db()
+    conn = db.get_conn()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        ad_id = db.add_ad(1, "seller", "TEXAS", "Машина", "Обычный", "sell",
+                          {"Название": "Infernus", "Цвет": "чёрный", "Пробег": "10", "Тюнинг": "нет", "Цена": "5kk"}, ["AgAC1"])
+    finally:
+        conn.set_trace_callback(None)
+    # строка ads без полей + одна пересборка после всех полей, а не по разу на каждое поле
+    writes = [s for s in statements if "INSERT INTO 'main'.'ads_fts_content'" in s]
+    deletes = [s for s in statements if "DELETE FROM 'main'.'ads_fts_content'" in s]
+    assert len(writes) == 2
+    assert len(deletes) == 1
+    found, _ = db.search_ads("черный", "TEXAS", limit=100)
+    assert ad_id in [a["id"] for a in found]
+    db.close_db()
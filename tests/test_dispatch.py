@@ -0,0 +1,52 @@
+import asyncio
+import time
+from telegram import Update
+from bot.dispatch import PerChatUpdateProcessor
+
+def _update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"}, "text": "x",
+        },
+    }, None)
+
+def test_busy_chat_does_not_delay_other_chats():
+    async def run():
+        processor = PerChatUpdateProcessor(4)
+        await processor.initialize()
+        finished = {}
+
+        async def handle(update: Update, delay: float):
+            await asyncio.sleep(delay)
+            finished[update.update_id] = time.perf_counter()
+
+        start = time.perf_counter()
+        # очередь из 20 обновлений одного чата, затем одно обновление другого чата
+        tasks = [asyncio.create_task(processor.process_update(u, handle(u, 0.05))) for u in (_update(i, 1) for i in range(20))]
+        await asyncio.sleep(0)
+        other = _update(100, 2)
+        tasks.append(asyncio.create_task(processor.process_update(other, handle(other, 0))))
+        await asyncio.gather(*tasks)
+        return finished[100] - start, [finished[i] for i in range(20)]
+
+    other_delay, busy = asyncio.run(run())
+    assert other_delay < 0.03
+    assert busy == sorted(busy)
+
+def test_limit_bounds_parallel_updates():
+    async def run():
+        processor = PerChatUpdateProcessor(3)
+        await processor.initialize()
+
+        async def handle():
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(processor.process_update(_update(i, i), handle()) for i in range(10)))
+        return processor.stats()
+
+    stats = asyncio.run(run())
+    assert stats["limit"] == 3
+    assert stats["max_active"] == 3
+    assert stats["processed"] == 10
@@ -0,0 +1,19 @@
+import pytest
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from bot.keyboards import KeyboardRegistry, StaticKeyboard
+
+def test_static_keyboard_memoises_dict():
+    rows = [[InlineKeyboardButton("Назад", callback_data="menu:back")]]
+    kb = StaticKeyboard(rows)
+    assert kb.to_dict() is kb.to_dict()
+    assert kb.to_dict() == InlineKeyboardMarkup(rows).to_dict()
+    assert kb == InlineKeyboardMarkup(rows)
+
+def test_static_keyboard_stays_frozen():
+    kb = StaticKeyboard([[InlineKeyboardButton("Назад", callback_data="menu:back")]])
+    with pytest.raises(AttributeError):
+        kb.inline_keyboard = ()
+
+def test_registry_builds_pickers():
+    keyboards = KeyboardRegistry(["TEXAS"], ["Машина"], ["Обычный"])
+    assert keyboards.servers.to_dict()["inline_keyboard"][0][0]["callback_data"] == "server:TEXAS"
@@ -0,0 +1,51 @@
+import pytest
+from bot.prices import PRICE_MAX, extract_prices, parse_price
+
+@pytest.mark.parametrize("text, expected", [
+    # форматы из шаблонов формы
+    ("1.5kk", 1_500_000),
+    ("150 000$", 150_000),
+    ("2 млн", 2_000_000),
+    ("300к", 300_000),
+    ("договорная", None),
+    ("", None),
+    (None, None),
+    # суффиксы
+    ("3 ляма", 3_000_000),
+    ("5 тыс", 5_000),
+    ("1.2b", 1_200_000_000),
+    ("2ккк", 2_000_000_000),
+    ("10kk/день", 10_000_000),
+    ("от 100к", 100_000),
+    # разделители
+    ("1 500 000", 1_500_000),
+    ("1.500.000", 1_500_000),
+    ("150.000", 150_000),
+    ("1,25kk", 1_250_000),
+    ("1.500кк", 1_500_000),
+    # неоднозначные записи
+    ("1к5", 1_500),
+    ("2кк5", 2_500_000),
+    ("1кк250", 1_250_000),
+    ("1к 5 шт", 1_000),
+    ("100 к 5", 100_000),
+    ("100-150к", 100_000),
+    ("100 – 150 кк", 100_000_000),
+    ("100к-150к", 100_000),
+    # за пределами PRICE_MAX — не цена
+    ("999999999kkk", None),
+])
+def test_parse_price(text, expected):
+    assert parse_price(text) == expected
+
+def test_parse_price_upper_bound():
+    assert parse_price(str(PRICE_MAX)) == PRICE_MAX
+    assert parse_price(str(PRICE_MAX + 1)) is None
+
+@pytest.mark.parametrize("fields, expected", [
+    ({"Цена": "1.5kk", "Доход за 1 день": "300к"}, (1_500_000, 300_000)),
+    ({"Бюджет": "2 млн", "Желаемый доход за 1 день": "договорная"}, (2_000_000, None)),
+    ({"Название": "Infernus 300к"}, (None, None)),
+])
+def test_extract_prices(fields, expected):
+    assert extract_prices(fields) == expected
@@ -0,0 +1,29 @@
+import sqlite3
+import pytest
+from bot import db
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "plans.db"))
+    conn.row_factory = sqlite3.Row
+    db.migrate(conn)
+    yield conn
+    conn.close()
+
+def test_no_full_scans_or_temp_sorts(conn):
+    assert db.check_query_plans(conn) == []
+
+@pytest.mark.parametrize("name, sql, params", db.query_plan_cases(), ids=[c[0] for c in db.query_plan_cases()])
+def test_case_uses_index(conn, name, sql, params):
+    plan = db.explain(conn, sql, params)
+    reads = [d for d in plan if d.startswith(("SEARCH", "SCAN"))]
+    # пустой план — вставка без чтения таблиц
+    for detail in reads:
+        materialized = any(m.startswith(("MATERIALIZE ", "CO-ROUTINE ")) and m.split()[1] == detail.split()[1] for m in plan)
+        assert " USING " in detail or "VIRTUAL TABLE INDEX" in detail or materialized, f"{name}: {detail}"
+
+def test_check_reports_full_scan(conn, monkeypatch):
+    monkeypatch.setattr(db, "query_plan_cases", lambda: [("by_username", "SELECT id FROM ads WHERE username = ? ORDER BY vip", ("u",))])
+    problems = db.check_query_plans(conn)
+    assert any("SCAN ads" in p for p in problems)
+    assert any("TEMP B-TREE" in p for p in problems)
@@ -0,0 +1,44 @@
+import asyncio
+import time
+from bot.ratelimit import BULK, TokenBucketRateLimiter
+
+async def _send(limiter: TokenBucketRateLimiter, chat_id: int, priority: str = None) -> float:
+    async def callback(*args, **kwargs):
+        return True
+
+    args = {"priority": priority} if priority else None
+    await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, args)
+    return time.perf_counter()
+
+def test_bulk_not_blocked_by_chat_throttled_interactive():
+    async def run():
+        limiter = TokenBucketRateLimiter(global_per_sec=30, chat_per_sec=0.5, chat_burst=1)
+        await _send(limiter, 1)
+        # второй ответ в тот же чат ждёт свою корзину ~2 с, глобальная свободна
+        interactive = asyncio.create_task(_send(limiter, 1))
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        bulk_done = await _send(limiter, 2, BULK)
+        interactive.cancel()
+        await asyncio.gather(interactive, return_exceptions=True)
+        return bulk_done - start
+
+    assert asyncio.run(run()) < 0.2
+
+def test_bulk_yields_to_interactive_on_global_bucket():
+    async def run():
+        limiter = TokenBucketRateLimiter(global_per_sec=5, chat_per_sec=100, chat_burst=100)
+        for chat_id in range(5):
+            await _send(limiter, chat_id)
+        order = []
+
+        async def send(chat_id, priority, label):
+            await _send(limiter, chat_id, priority)
+            order.append(label)
+
+        bulk = asyncio.create_task(send(100, BULK, "bulk"))
+        await asyncio.sleep(0)
+        await asyncio.gather(bulk, send(101, None, "interactive"))
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "bulk"]
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import pytest
+from bot import db, repo
+from bot.cache import ad_cards, deleted_ads
+
+@pytest.fixture
+def ad_id():
+    db.init_db()
+    ad_cards.clear()
+    deleted_ads.clear()
+    yield db.add_ad(1, "seller", "TEXAS", "Машина", "Обычный", "sell", {"Название": "Infernus"}, [])
+    repo.shutdown()
+    db.close_db()
+
+def test_read_started_before_delete_is_not_returned(ad_id, monkeypatch):
+    read_done = threading.Event()
+    release = threading.Event()
+    get_ad = db.get_ad
+
+    def slow_get_ad(i):
+        ad = get_ad(i)
+        read_done.set()
+        release.wait(5)
+        return ad
+
+    async def run():
+        monkeypatch.setattr(db, "get_ad", slow_get_ad)
+        reader = asyncio.create_task(repo.get_ad(ad_id))
+        await asyncio.get_running_loop().run_in_executor(None, read_done.wait, 5)
+        monkeypatch.setattr(db, "get_ad", get_ad)
+        assert await repo.delete_ad(ad_id)
+        release.set()
+        return await reader
+
+    assert asyncio.run(run()) is None
+    assert ad_cards.get(ad_id) is None
+
+def test_failed_delete_keeps_ad_readable(ad_id):
+    async def run():
+        assert await repo.delete_ad(ad_id)
+        assert not await repo.delete_ad(ad_id + 1000)
+        return await repo.get_ad(ad_id + 1000)
+
+    assert asyncio.run(run()) is None
+    assert deleted_ads.get(ad_id + 1000) is None
@@ -0,0 +1,59 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from bot import db, repo
+import bot.main as m
+from bot.cache import ad_cards
+
+class _Message:
+    photo = ()
+
+    def __init__(self):
+        self.sent = []
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        self.sent.append(text)
+
+    async def reply_photo(self, photo, caption=None, reply_markup=None, **kwargs):
+        self.sent.append(caption)
+
+class _Query:
+    def __init__(self, data):
+        self.data = data
+        self.message = _Message()
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+@pytest.fixture
+def ads():
+    db.init_db(m.FIELD_KEYS)
+    with db.write_tx() as conn:
+        conn.execute("DELETE FROM ads")
+    ad_cards.clear()
+    ids = [db.add_ad(1, "seller", "TEXAS", "Машина", "Обычный", "sell", {"Название": f"Infernus {i}", "Цена": f"{i}kk"}, []) for i in range(1, 4)]
+    yield ids
+    repo.shutdown()
+    db.close_db()
+
+def test_get_ads_page_reads_ids_only(ads):
+    ad_id, more = db.get_ads_page("TEXAS", "Машина", "sell", sort="price")
+    assert (ad_id, more) == (ads[0], True)
+    assert db.get_ads_page("TEXAS", "Машина", "buy") == (None, False)
+
+def test_search_uses_cached_card(ads, monkeypatch):
+    context = SimpleNamespace(user_data={"search_server": "TEXAS"})
+
+    def search():
+        query = _Query("search_cheap:sell:Машина")
+        asyncio.run(m.search_do_callback(SimpleNamespace(callback_query=query), context))
+        return query.message.sent
+
+    first = search()
+    assert "Infernus 1" in first[0]
+
+    async def no_get_ad(ad_id):
+        raise AssertionError("get_ad при закэшированной карточке")
+
+    monkeypatch.setattr(repo, "get_ad", no_get_ad)
+    assert search() == first
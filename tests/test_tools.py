@@ -0,0 +1,46 @@
+import json
+import pytest
+from bot import db, tools
+
+def _ad(ad_id: int, price: str) -> dict:
+    return {
+        "id": ad_id, "user_id": 1, "username": "seller", "server": "Moscow", "category": "Машина",
+        "type": "Обычный", "action": "sell", "fields": {"Название": f"Infernus {ad_id}", "Цена": price}, "photos": ["AgAC1"],
+    }
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    db.init_db()
+    with db.write_tx() as conn:
+        conn.execute("DELETE FROM ads")
+        conn.execute("DELETE FROM import_progress")
+    yield
+    db.close_db()
+
+@pytest.mark.parametrize("name", ["ads.jsonl", "ads.csv"])
+def test_import_twice_and_reexport_to_same_path(tmp_path, name):
+    path = str(tmp_path / name)
+    db.import_ads([_ad(1, "10kk"), _ad(2, "20kk")])
+    assert tools.export_table("ads", path)["rows"] == 2
+
+    assert tools.import_table("ads", path)["rows"] == 2
+    # повторный запуск с тем же файлом загружает его заново, а не «продолжает» с конца
+    assert tools.import_table("ads", path)["rows"] == 2
+
+    # новая выгрузка под тем же именем — обычный перенос staging -> production
+    db.import_ads([_ad(3, "30kk")])
+    assert tools.export_table("ads", path)["rows"] == 3
+    with db.write_tx() as conn:
+        conn.execute("DELETE FROM ads")
+    assert tools.import_table("ads", path)["rows"] == 3
+    ad = db.get_ad(3)
+    assert ad["fields"] == {"Название": "Infernus 3", "Цена": "30kk"}
+    assert ad["photos"] == ["AgAC1"]
+
+def test_interrupted_import_resumes(tmp_path):
+    path = tmp_path / "ads.jsonl"
+    path.write_text("".join(json.dumps(_ad(i, f"{i}kk"), ensure_ascii=False) + "\n" for i in range(1, 6)), encoding="utf-8")
+    source = tools._source("ads", str(path))
+    db.set_import_progress(source, 3)
+    assert tools.import_table("ads", str(path), batch=1)["rows"] == 2
+    assert db.get_import_progress(source) == 0
@@ -0,0 +1,23 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from bot.webhook import SECRET_HEADER, make_webhook_app
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "text": "x"}}
+
+def _post(headers):
+    async def run():
+        app = SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+        async with TestClient(TestServer(make_webhook_app(app, "/telegram", "s3cret"))) as client:
+            response = await client.post("/telegram", json=UPDATE, headers=headers)
+            return response.status, app.update_queue.qsize()
+
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("headers", [{}, {SECRET_HEADER: "wrong"}, {SECRET_HEADER: "s3cretё"}, {SECRET_HEADER: "пароль"}])
+def test_wrong_secret_is_forbidden(headers):
+    assert _post(headers) == (403, 0)
+
+def test_valid_secret_queues_update():
+    assert _post({SECRET_HEADER: "s3cret"}) == (200, 1)